@@ -1,13 +1,153 @@
 import streamlit as st
 import math
-import pandas as pd
 from datetime import datetime
-import io
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
+import os
+import history
+
+APP_VERSION = "1.1.0"
+
+# numpy, pandas, reportlab and the calculator modules are imported inside the
+# branches that use them, so the first render only pays for streamlit itself
+
+# Dilution options from 10^-1 to 10^-9
+DILUTION_OPTIONS = {
+    "10⁻¹ (0.1)": 10,
+    "10⁻² (0.01)": 100,
+    "10⁻³ (0.001)": 1000,
+    "10⁻⁴": 10000,
+    "10⁻⁵": 100000,
+    "10⁻⁶": 1000000,
+    "10⁻⁷": 10000000,
+    "10⁻⁸": 100000000,
+    "10⁻⁹": 1000000000
+}
+
+# Incubation time in hours (2 days = 48h to 14 days = 336h)
+INCUBATION_OPTIONS = {f"{days} days ({days * 24}h)": days * 24 for days in range(2, 15)}
+
+CELL_LINES = ["MDCK-DP", "Vero", "BHK-21", "A549", "HEK293", "HEP-2", "HeLa"]
+PLATE_TYPES = ["6-well plate", "12-well plate", "24-well plate", "35mm dish", "60mm dish", "100mm dish"]
+OVERLAY_TYPES = ["Agar overlay", "Agarose overlay", "Methylcellulose overlay", "CMC overlay"]
+
+# History search facets (history_index.FACETS) and their labels
+HISTORY_FACETS = {
+    'type': "Calculator",
+    'method': "Method",
+    'cell_line': "Cell Line",
+    'overlay': "Overlay",
+    'plate_type': "Plate Type",
+}
+
+DARK_MODE_CSS = """
+        <style>
+        .stApp {
+            background-color: #0E1117;
+            color: #FAFAFA;
+        }
+        .stTextInput > div > div > input,
+        .stSelectbox > div > div > div,
+        .stNumberInput > div > div > input {
+            background-color: #262730;
+            color: #FAFAFA;
+        }
+        .stMarkdown {
+            color: #FAFAFA;
+        }
+        </style>
+        """
+
+
+def audit_calculation(calculation, inputs, outputs, method=None):
+    # Append to the tamper-evident audit log (audit.py); returns once the record
+    # is on disk. Called before a result is shown or saved: if the write fails,
+    # the run stops there, so no result reaches the user unaudited.
+    import audit
+    try:
+        audit.record(calculation, inputs, outputs, method, APP_VERSION, st.session_state.get("operator") or None)
+    except (OSError, audit.AuditError) as e:
+        st.error(f"❌ Audit log write failed, so the result was not shown or saved: {e}")
+        st.stop()
+
+
+def start_job(label, fn, *args, file_name=None, mime=None, **kwargs):
+    # Run fn on a background pool; jobs with a file_name are downloads (reports,
+    # exports), go on the short-job pool and get a download in the sidebar
+    import jobs
+    try:
+        job_id = jobs.submit(label, fn, *args, session=st.session_state.session_id,
+                             kind="report" if file_name else "batch", **kwargs)
+    except RuntimeError as e:
+        st.error(f"❌ {e}")
+        return None
+    st.session_state.background_jobs.append({'id': job_id, 'file_name': file_name, 'mime': mime})
+    return job_id
+
+
+def collect_job(key, running_text):
+    # Poll the job whose id is stored under a session key; returns its result once done
+    job_id = st.session_state.get(key)
+    if job_id is None:
+        return None
+    import jobs
+    job = jobs.status(job_id)
+    if job is not None and job['state'] in jobs.ACTIVE_STATES:
+        detail = job['message'] or f"{job['progress']:.0%}"
+        st.info(f"⏳ {running_text} in the background ({detail}) - progress is under **Background Jobs** in the sidebar")
+        return None
+    st.session_state[key] = None
+    if job is None:
+        return None
+    if job['state'] == 'failed':
+        st.error(f"❌ {job['error']}")
+    elif job['state'] == 'cancelled':
+        st.warning("⚠️ Job cancelled")
+    else:
+        return jobs.result(job_id)
+    return None
+
+
+def dismiss_job(job_id):
+    import jobs
+    jobs.forget(job_id)
+    st.session_state.background_jobs = [j for j in st.session_state.background_jobs if j['id'] != job_id]
+
+
+def render_jobs(watching=()):
+    import jobs
+    st.markdown("### ⏳ Background Jobs")
+    st.caption("Reports, exports and batch runs render here while you keep calculating")
+    
+    for entry in st.session_state.background_jobs[::-1][:10]:
+        job = jobs.status(entry['id'])
+        if job is None:
+            continue
+        
+        if job['state'] in jobs.ACTIVE_STATES:
+            st.progress(job['progress'], text=f"{job['label']} - {job['message'] or job['state']}")
+            st.button("Cancel", key=f"cancel_{job['id']}", on_click=jobs.cancel, args=(job['id'],))
+            continue
+        
+        icon = {'done': "✅", 'failed': "❌", 'cancelled': "⚠️"}[job['state']]
+        st.write(f"{icon} {job['label']}")
+        if job['state'] == 'failed':
+            st.caption(job['error'])
+        col_job1, col_job2 = st.columns([3, 1])
+        with col_job1:
+            if job['state'] == 'done' and entry['file_name']:
+                st.download_button(
+                    label="Download",
+                    data=jobs.result(job['id']),
+                    file_name=entry['file_name'],
+                    mime=entry['mime'],
+                    key=f"download_{job['id']}"
+                )
+        with col_job2:
+            st.button("✖", key=f"dismiss_{job['id']}", on_click=dismiss_job, args=(job['id'],))
+    
+    # Full rerun once a job this run was waiting on finishes, so tabs pick up results
+    if any((jobs.status(job_id) or {}).get('state') not in jobs.ACTIVE_STATES for job_id in watching):
+        st.rerun()
+
 
 # Page config
 st.set_page_config(
@@ -20,6 +160,14 @@ st.set_page_config(
 if 'calculation_history' not in st.session_state:
     st.session_state.calculation_history = []
 
+# Background jobs submitted from this session (ids into jobs.py)
+if 'background_jobs' not in st.session_state:
+    st.session_state.background_jobs = []
+
+# Scopes the per-session cap on background jobs
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = os.urandom(8).hex()
+
 # Initialize dark mode state
 if 'dark_mode' not in st.session_state:
     st.session_state.dark_mode = False
@@ -35,60 +183,116 @@ with st.sidebar:
     
     # Apply dark mode CSS
     if st.session_state.dark_mode:
-        st.markdown("""
-        <style>
-        .stApp {
-            background-color: #0E1117;
-            color: #FAFAFA;
-        }
-        .stTextInput > div > div > input,
-        .stSelectbox > div > div > div,
-        .stNumberInput > div > div > input {
-            background-color: #262730;
-            color: #FAFAFA;
-        }
-        .stMarkdown {
-            color: #FAFAFA;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        st.markdown(DARK_MODE_CSS, unsafe_allow_html=True)
+    
+    st.text_input(
+        "👤 Operator",
+        help="Recorded with every PFU, Reverse and TCID50 calculation in the audit log (defaults to the server user)",
+        key="operator"
+    )
     
     st.markdown("---")
     
     # Calculation History Section
     st.markdown("### 📊 Calculation History")
     
+    # Results appended by the watch-folder ingestion service (ingest.py)
+    if os.path.exists(history.HISTORY_PATH):
+        if st.button("📂 Load Ingested Results", use_container_width=True):
+            ingested, st.session_state.ingest_offset = history.read_history(
+                history.HISTORY_PATH, st.session_state.get("ingest_offset", 0)
+            )
+            st.session_state.calculation_history.extend(ingested)
+            st.success(f"Loaded {len(ingested)} new result(s)")
+    
     if len(st.session_state.calculation_history) > 0:
         st.write(f"**Total Calculations:** {len(st.session_state.calculation_history)}")
         
         # Export history as CSV
         if st.button("📥 Export History (CSV)", use_container_width=True):
-            # Create DataFrame from history
-            df = pd.DataFrame(st.session_state.calculation_history)
-            
-            # Convert to CSV
-            csv = df.to_csv(index=False)
-            
-            # Download button
-            st.download_button(
-                label="Download CSV",
-                data=csv,
+            import jobs
+            # Exported in the background; the download appears under Background Jobs
+            start_job(
+                f"History export ({len(st.session_state.calculation_history)} rows)",
+                history.export_csv, list(st.session_state.calculation_history),
+                progress=jobs.report_progress,
                 file_name=f"titer_calculations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
+                mime="text/csv"
             )
         
+        # Consolidated methods section for every PFU, TCID50 and PRNT entry
+        col_methods1, col_methods2 = st.columns([3, 2])
+        with col_methods1:
+            methods_format = st.selectbox("Methods format", options=["Text", "Markdown", "Word (DOCX)"],
+                                          label_visibility="collapsed", key="methods_export_format")
+        with col_methods2:
+            if st.button("📝 Methods", use_container_width=True, help="Methods section grouped by protocol, with per-assay tables"):
+                import methods
+                extension, mime = methods.EXPORT_FORMATS[methods_format][1:]
+                start_job(
+                    f"Methods section ({methods_format})",
+                    methods.export_history, list(st.session_state.calculation_history), methods_format,
+                    file_name=f"methods_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime
+                )
+        
         # Clear history button
-        if st.button("🗑️ Clear History", use_container_width=True):
+        if st.button("🗑️ Clear History", use_container_width=True, help="Clears this session's history; the audit log is never cleared"):
             st.session_state.calculation_history = []
+            # The search index refers to the old rows by position
+            st.session_state.pop('history_index', None)
             st.success("History cleared!")
             st.rerun()
         
-        # Show recent calculations
-        with st.expander("View Recent Calculations"):
-            recent = st.session_state.calculation_history[-5:][::-1]  # Last 5, reversed
-            for i, calc in enumerate(recent):
-                st.text(f"{i+1}. {calc.get('type', 'N/A')} - {calc.get('result', 'N/A')}")
+        # Search calculations (indexed incrementally; only one page of rows is rendered)
+        with st.expander("🔎 Search History"):
+            import history_index
+            if 'history_index' not in st.session_state:
+                st.session_state.history_index = history_index.new_index()
+            index = history_index.update_index(st.session_state.history_index, st.session_state.calculation_history)
+            
+            search_text = st.text_input("Search", placeholder="Sample, plate, file...", key="history_search_text")
+            
+            search_filters = {}
+            for field, label in HISTORY_FACETS.items():
+                counts = dict(history_index.facet_values(index, field))
+                if counts:
+                    search_filters[field] = st.multiselect(
+                        label,
+                        options=list(counts),
+                        format_func=lambda value, counts=counts: f"{value} ({counts[value]})",
+                        key=f"history_facet_{field}"
+                    )
+            
+            search_dates = st.date_input("Date Range", value=(), key="history_dates")
+            
+            filter_titer = st.checkbox("Filter by titer", key="history_filter_titer")
+            titer_exps = st.slider(
+                "Titer (log10)",
+                min_value=0.0,
+                max_value=14.0,
+                value=(4.0, 10.0),
+                step=0.5,
+                disabled=not filter_titer,
+                key="history_titer_range"
+            )
+            
+            search_results = history_index.search(
+                index,
+                search_filters,
+                text=search_text,
+                titer_range=(10 ** titer_exps[0], 10 ** titer_exps[1]) if filter_titer else None,
+                date_range=tuple(search_dates) if len(search_dates) == 2 else None,
+                page=st.session_state.get("history_page", 1) - 1
+            )
+            
+            st.caption(f"{search_results['total']} match(es) · page {search_results['page'] + 1} of {search_results['pages']}")
+            for i, row_id in enumerate(search_results['ids']):
+                calc = st.session_state.calculation_history[row_id]
+                st.text(f"{search_results['page'] * history_index.PAGE_SIZE + i + 1}. {calc.get('timestamp', '')} {calc.get('type', 'N/A')} - {calc.get('result', 'N/A')}")
+            
+            if search_results['pages'] > 1:
+                st.number_input("Page", min_value=1, step=1, key="history_page")
     else:
         st.info("No calculations yet")
 
@@ -97,7 +301,7 @@ st.title("🦠 Viral Titer Calculator")
 st.markdown("Professional calculators for virology research workflows")
 
 # Create tabs for different calculators
-tab1, tab2, tab3 = st.tabs(["🧮 PFU Calculator", "🔄 Reverse Calculator", "🧬 TCID50 Calculator"])
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🧮 PFU Calculator", "🔄 Reverse Calculator", "🧬 TCID50 Calculator", "🛡️ PRNT Calculator", "📈 Growth Kinetics", "🎲 Assay Design", "🔬 Plate Reader"])
 
 # ============================================================================
 # TAB 1: PFU TITER CALCULATOR
@@ -122,28 +326,15 @@ with tab1:
         )
     
     with col2:
-        # Create dilution options from 10^-1 to 10^-9
-        dilution_options = {
-            "10⁻¹ (0.1)": 10,
-            "10⁻² (0.01)": 100,
-            "10⁻³ (0.001)": 1000,
-            "10⁻⁴": 10000,
-            "10⁻⁵": 100000,
-            "10⁻⁶": 1000000,
-            "10⁻⁷": 10000000,
-            "10⁻⁸": 100000000,
-            "10⁻⁹": 1000000000
-        }
-        
         dilution_label = st.selectbox(
             "Dilution Factor",
-            options=list(dilution_options.keys()),
+            options=list(DILUTION_OPTIONS.keys()),
             index=5,  # Default to 10^-6
             help="Select the dilution used for plating",
             key="pfu_dilution"
         )
         
-        dilution = dilution_options[dilution_label]
+        dilution = DILUTION_OPTIONS[dilution_label]
     
     with col3:
         volume = st.number_input(
@@ -163,39 +354,22 @@ with tab1:
     with col4:
         cell_line = st.selectbox(
             "Cell Line",
-            options=["MDCK-DP", "Vero", "BHK-21", "A549", "HEK293", "HEP-2", "HeLa"],
+            options=CELL_LINES,
             index=0,  # Default to MDCK-DP
             help="Cell line used for the plaque assay",
             key="pfu_cell_line"
         )
     
     with col5:
-        # Incubation time in hours (2 days = 48h to 14 days = 336h)
-        incubation_options = {
-            "2 days (48h)": 48,
-            "3 days (72h)": 72,
-            "4 days (96h)": 96,
-            "5 days (120h)": 120,
-            "6 days (144h)": 144,
-            "7 days (168h)": 168,
-            "8 days (192h)": 192,
-            "9 days (216h)": 216,
-            "10 days (240h)": 240,
-            "11 days (264h)": 264,
-            "12 days (288h)": 288,
-            "13 days (312h)": 312,
-            "14 days (336h)": 336
-        }
-        
         incubation_label = st.selectbox(
             "Incubation Time",
-            options=list(incubation_options.keys()),
+            options=list(INCUBATION_OPTIONS.keys()),
             index=1,  # Default to 3 days
             help="Time plates were incubated before counting",
             key="pfu_incubation"
         )
         
-        incubation_hours = incubation_options[incubation_label]
+        incubation_hours = INCUBATION_OPTIONS[incubation_label]
         incubation_days = incubation_hours // 24
     
     with col6:
@@ -213,7 +387,7 @@ with tab1:
     with col7:
         plate_type = st.selectbox(
             "Plate Type",
-            options=["6-well plate", "12-well plate", "24-well plate", "35mm dish", "60mm dish", "100mm dish"],
+            options=PLATE_TYPES,
             index=0,
             help="Type of culture vessel used",
             key="pfu_plate_type"
@@ -222,7 +396,7 @@ with tab1:
     with col8:
         overlay_type = st.selectbox(
             "Overlay Medium",
-            options=["Agar overlay", "Agarose overlay", "Methylcellulose overlay", "CMC overlay"],
+            options=OVERLAY_TYPES,
             index=0,
             help="Type of overlay used to restrict viral spread",
             key="pfu_overlay"
@@ -230,31 +404,35 @@ with tab1:
     
     # Calculate button
     if st.button("Calculate PFU/mL", type="primary", key="pfu_calc_button"):
-        # Convert µL to mL
-        volume_ml = volume / 1000
-        
+        import calculators
         # Calculate PFU/mL
-        pfu_ml = (plaques * dilution) / volume_ml
+        pfu_ml = float(calculators.pfu_per_ml(plaques, dilution, volume))
+        
+        # Exponent of the plated dilution (10^-exponent)
+        exponent = int(math.log10(dilution)) if dilution > 1 else 0
+        titer_display = calculators.format_titer(pfu_ml, "PFU/mL")
+        
+        audit_calculation(
+            'PFU',
+            {'plaques': plaques, 'dilution_factor': dilution, 'volume_ul': volume, 'cell_line': cell_line,
+             'incubation_hours': incubation_hours, 'replicates': replicates, 'plate_type': plate_type,
+             'overlay': overlay_type},
+            {'pfu_per_ml': pfu_ml, 'result': titer_display,
+             'countability': 'Valid' if calculators.is_countable(plaques) else 'Warning'},
+            method="Plaque assay"
+        )
         
         # Countability check
         st.subheader("Results")
         
-        if plaques < 30:
-            st.warning(f"⚠️ Plaque count ({plaques}) is below 30 - results may lack statistical reliability")
-        elif plaques > 300:
-            st.warning(f"⚠️ Plaque count ({plaques}) is above 300 - plate may be too confluent for accurate counting")
+        if plaques < calculators.COUNTABLE_MIN:
+            st.warning(f"⚠️ Plaque count ({plaques}) is below {calculators.COUNTABLE_MIN} - results may lack statistical reliability")
+        elif plaques > calculators.COUNTABLE_MAX:
+            st.warning(f"⚠️ Plaque count ({plaques}) is above {calculators.COUNTABLE_MAX} - plate may be too confluent for accurate counting")
         else:
-            st.success("✅ Plaque count is within optimal range (30-300)")
+            st.success(f"✅ Plaque count is within optimal range ({calculators.COUNTABLE_MIN}-{calculators.COUNTABLE_MAX})")
         
         # Display result with proper scientific notation and dark green color
-        # Convert to scientific notation format
-        if pfu_ml > 0:
-            exponent = int(math.floor(math.log10(pfu_ml)))
-            mantissa = pfu_ml / (10 ** exponent)
-            titer_display = f"{mantissa:.2f} × 10^{exponent} PFU/mL"
-        else:
-            titer_display = "0 PFU/mL"
-        
         st.markdown(f"### Viral Titer")
         st.markdown(f"<h2 style='color: #006400; margin-top: -10px;'>{titer_display}</h2>", unsafe_allow_html=True)
         
@@ -267,7 +445,25 @@ with tab1:
             'volume_ul': volume,
             'result': titer_display,
             'cell_line': cell_line,
-            'countability': 'Valid' if 30 <= plaques <= 300 else 'Warning'
+            'plate_type': plate_type,
+            'overlay': overlay_type,
+            'replicates': replicates,
+            'incubation_hours': incubation_hours,
+            'countability': 'Valid' if calculators.is_countable(plaques) else 'Warning'
+        })
+        
+        # Build the methods paragraph (also used in the PDF report)
+        import methods
+        methods_text = methods.pfu_methods({
+            'cell_line': cell_line,
+            'plate_type': plate_type,
+            'volume_ul': volume,
+            'replicates': replicates,
+            'overlay': overlay_type,
+            'incubation_hours': incubation_hours,
+            'dilution_exp': exponent,
+            'plaques': plaques,
+            'result': titer_display
         })
         
         # Copy and Export buttons
@@ -279,30 +475,10 @@ with tab1:
                 st.success("✓ Copy from box above")
         
         with col_btn2:
-            # Generate PDF report
-            pdf_buffer = io.BytesIO()
-            doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#006400'),
-                spaceAfter=30,
-            )
-            story.append(Paragraph("PFU Titer Calculation Report", title_style))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Results
-            story.append(Paragraph(f"<b>Viral Titer:</b> {titer_display}", styles['Normal']))
-            story.append(Spacer(1, 0.1*inch))
-            
-            # Input data table
-            data = [
-                ['Parameter', 'Value'],
+            # Generate PDF report in the background
+            import jobs
+            import reports
+            start_job(f"PFU report ({titer_display})", reports.pfu_report, titer_display, [
                 ['Plaques Counted', str(plaques)],
                 ['Dilution Factor', f"10^-{exponent}"],
                 ['Volume Plated', f"{volume:.0f} µL"],
@@ -311,56 +487,15 @@ with tab1:
                 ['Replicates', str(replicates)],
                 ['Plate Type', plate_type],
                 ['Overlay', overlay_type]
-            ]
-            
-            table = Table(data, colWidths=[2.5*inch, 3*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            story.append(table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Methods section
-            story.append(Paragraph("<b>Methods:</b>", styles['Heading2']))
-            story.append(Paragraph(methods_text, styles['Normal']))
-            
-            # Footer
-            story.append(Spacer(1, 0.5*inch))
-            story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Italic']))
-            
-            doc.build(story)
-            pdf_buffer.seek(0)
-            
-            st.download_button(
-                label="📄 Download PDF Report",
-                data=pdf_buffer,
+            ], methods_text, progress=jobs.report_progress,
                 file_name=f"PFU_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                mime="application/pdf",
-                use_container_width=True
-            )
+                mime="application/pdf")
+            
+            st.info("📄 PDF report is rendering - download it from **Background Jobs** in the sidebar")
         
         # Methods section
         st.subheader("Methods Section")
         
-        # Calculate the exponent for better methods text
-        if dilution > 1:
-            exponent = int(math.log10(dilution))
-        else:
-            exponent = 0
-        
-        # Build comprehensive methods paragraph
-        replicate_text = "in duplicate" if replicates == 2 else "in triplicate" if replicates == 3 else f"with {replicates} replicates" if replicates > 1 else ""
-        
-        methods_text = f"""Viral titers were determined by plaque assay on {cell_line} cells. Confluent cell monolayers in {plate_type}s were prepared 24 hours prior to infection. Serial 10-fold dilutions of virus stocks were prepared in infection medium, and {volume:.0f} µL of each dilution was inoculated onto the cells {replicate_text}. After 1 hour adsorption at 37°C with 5% CO₂, the inoculum was removed and cells were overlaid with {overlay_type.lower()}. Plates were incubated at 37°C with 5% CO₂ for {incubation_days} days ({incubation_hours} hours). Following incubation, cells were fixed with 4% formaldehyde and stained with 0.1% crystal violet to visualize plaques. Plaques from the 10⁻{exponent} dilution were manually counted ({plaques} plaques{' per well, averaged across replicates' if replicates > 1 else ''}), and viral titers were calculated as {titer_display}."""
-        
         st.text_area("Copy for your methods:", methods_text, height=200, key="methods_text_area")
         
         # Add a copy button that shows the text in a copyable format
@@ -438,6 +573,13 @@ with tab2:
         volume_needed_ml = target_pfu / stock_titer_pfu_ml
         volume_needed_ul = volume_needed_ml * 1000
         
+        audit_calculation(
+            'Reverse/Dilution',
+            {'stock_titer_pfu_ml': stock_titer_pfu_ml, 'target_pfu': target_pfu},
+            {'volume_needed_ul': volume_needed_ul},
+            method="Volume = target PFU / stock titer"
+        )
+        
         # Save to calculation history
         st.session_state.calculation_history.append({
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -499,7 +641,8 @@ with tab3:
         "Calculation Method",
         options=["Reed-Muench", "Spearman-Karber"],
         horizontal=True,
-        help="Reed-Muench: Most common method. Spearman-Karber: Better for incomplete data"
+        help="Reed-Muench: Most common method. Spearman-Karber: Better for incomplete data",
+        key="tcid_method"
     )
     
     # Input section
@@ -605,13 +748,14 @@ with tab3:
     with col_param2:
         tcid_cell_line = st.selectbox(
             "Cell Line",
-            options=["MDCK-DP", "Vero", "BHK-21", "A549", "HEK293", "HEP-2", "HeLa"],
+            options=CELL_LINES,
             index=0,
             key="tcid_cell_line"
         )
     
     # Calculate button
     if st.button("Calculate TCID50", type="primary", key="tcid_calc_button"):
+        import calculators
         
         # Validation
         valid_data = True
@@ -642,45 +786,49 @@ with tab3:
         else:
             st.subheader("Results")
             
+            series_exps = [d['dilution_exp'] for d in dilution_data]
+            series_positive = [d['positive'] for d in dilution_data]
+            series_total = [d['total'] for d in dilution_data]
+            
             # Reed-Muench Calculation
             if calculation_method == "Reed-Muench":
-                # Find dilutions above and below 50%
-                above_50 = [d for d in dilution_data if d['percent'] >= 50]
-                below_50 = [d for d in dilution_data if d['percent'] < 50]
+                # Interpolate between the dilutions just above and just below 50%
+                rm = calculators.reed_muench(series_exps, series_positive, series_total)
+                log_dilution = float(rm['log_dilution'])
+                tcid_inputs = {'dilution_exps': series_exps, 'positive': series_positive, 'total': series_total,
+                               'volume_ul': inoculum_volume, 'cell_line': tcid_cell_line}
                 
-                if above_50 and below_50:
-                    # Get the dilution just above and just below 50%
-                    dilution_above = max(above_50, key=lambda x: x['dilution_exp'])
-                    dilution_below = min(below_50, key=lambda x: x['dilution_exp'])
-                    
-                    # Calculate proportionate distance
-                    percent_above = dilution_above['percent']
-                    percent_below = dilution_below['percent']
-                    
-                    proportionate_distance = (percent_above - 50) / (percent_above - percent_below)
+                if not math.isnan(log_dilution):
+                    exp_above = int(rm['exp_above'])
+                    exp_below = int(rm['exp_below'])
+                    percent_above = float(rm['percent_above'])
+                    percent_below = float(rm['percent_below'])
+                    proportionate_distance = float(rm['proportionate_distance'])
                     
                     # Calculate TCID50 dilution
-                    log_dilution = dilution_above['dilution_exp'] + proportionate_distance
                     tcid50_dilution_factor = 10 ** abs(log_dilution)
                     
                     # Calculate TCID50/mL
                     volume_ml = inoculum_volume / 1000
-                    tcid50_per_ml = tcid50_dilution_factor / volume_ml
+                    tcid50_per_ml = float(calculators.tcid50_per_ml(log_dilution, inoculum_volume))
+                    
+                    # PFU conversion (calculate first before saving to history)
+                    pfu_equivalent = tcid50_per_ml * calculators.TCID50_TO_PFU
+                    pfu_display = calculators.format_titer(pfu_equivalent, "PFU/mL")
+                    
+                    audit_calculation(
+                        'TCID50', tcid_inputs,
+                        {'log10_tcid50_dilution': log_dilution, 'tcid50_per_ml': tcid50_per_ml,
+                         'pfu_equivalent_per_ml': pfu_equivalent},
+                        method="Reed-Muench"
+                    )
                     
                     # Display result
-                    exponent = int(math.floor(math.log10(tcid50_per_ml)))
-                    mantissa = tcid50_per_ml / (10 ** exponent)
-                    tcid50_display = f"{mantissa:.2f} × 10^{exponent} TCID50/mL"
+                    tcid50_display = calculators.format_titer(tcid50_per_ml, "TCID50/mL")
                     
                     st.markdown(f"### TCID50 Titer")
                     st.markdown(f"<h2 style='color: #006400; margin-top: -10px;'>{tcid50_display}</h2>", unsafe_allow_html=True)
                     
-                    # PFU conversion (calculate first before saving to history)
-                    pfu_equivalent = tcid50_per_ml * 0.7
-                    pfu_exp = int(math.floor(math.log10(pfu_equivalent)))
-                    pfu_mant = pfu_equivalent / (10 ** pfu_exp)
-                    pfu_display = f"{pfu_mant:.2f} × 10^{pfu_exp} PFU/mL"
-                    
                     # Save to calculation history
                     st.session_state.calculation_history.append({
                         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -688,7 +836,9 @@ with tab3:
                         'result': tcid50_display,
                         'pfu_equivalent': pfu_display,
                         'cell_line': tcid_cell_line,
-                        'num_dilutions': num_dilutions
+                        'num_dilutions': num_dilutions,
+                        'volume_ul': inoculum_volume,
+                        'wells_per_dilution': dilution_data[0]['total']
                     })
                     
                     st.info(f"📊 **Approximate PFU equivalent:** {pfu_display} (using 0.7 conversion factor)")
@@ -698,10 +848,10 @@ with tab3:
                         st.markdown(f"""
                         **Reed-Muench Method:**
                         
-                        - Dilution above 50%: 10^{dilution_above['dilution_exp']} ({percent_above:.1f}% positive)
-                        - Dilution below 50%: 10^{dilution_below['dilution_exp']} ({percent_below:.1f}% positive)
+                        - Dilution above 50%: 10^{exp_above} ({percent_above:.1f}% cumulative infected)
+                        - Dilution below 50%: 10^{exp_below} ({percent_below:.1f}% cumulative infected)
                         - Proportionate Distance: ({percent_above:.1f} - 50) / ({percent_above:.1f} - {percent_below:.1f}) = {proportionate_distance:.4f}
-                        - Log10 TCID50 dilution: {dilution_above['dilution_exp']} + {proportionate_distance:.4f} = {log_dilution:.4f}
+                        - Log10 TCID50 dilution: {exp_above} - {proportionate_distance:.4f} × {exp_above - exp_below} = {log_dilution:.4f}
                         - TCID50 dilution factor: 10^{abs(log_dilution):.4f} = {tcid50_dilution_factor:.2e}
                         - TCID50/mL: {tcid50_dilution_factor:.2e} / {volume_ml} mL = {tcid50_per_ml:.2e}
                         """)
@@ -718,6 +868,7 @@ with tab3:
                         st.dataframe(df, use_container_width=True)
                     
                 else:
+                    audit_calculation('TCID50', tcid_inputs, {'error': "No clear 50% endpoint"}, method="Reed-Muench")
                     st.error("❌ Cannot calculate: No clear 50% endpoint detected")
             
             # Spearman-Karber Calculation
@@ -725,41 +876,40 @@ with tab3:
                 # Sort by dilution (highest to lowest concentration)
                 sorted_data = sorted(dilution_data, key=lambda x: x['dilution_exp'], reverse=True)
                 
-                # Calculate proportions
-                proportions = [d['positive'] / d['total'] for d in sorted_data]
-                
-                # Calculate sum of proportions
-                sum_proportions = sum(proportions)
-                
-                # Get lowest dilution (highest concentration)
-                x0 = sorted_data[0]['dilution_exp']
-                
                 # Dilution factor (log spacing)
                 d = 1  # Assuming 10-fold dilutions
                 
                 # Spearman-Karber formula: TCID50 = 10^(x0 - d(S - 0.5))
-                log_tcid50 = x0 - d * (sum_proportions - 0.5)
+                sk = calculators.spearman_karber(series_exps, series_positive, series_total, log_step=d)
+                sum_proportions = float(sk['sum_proportions'])
+                x0 = int(sk['x0'])
+                log_tcid50 = float(sk['log_dilution'])
                 
                 tcid50_dilution_factor = 10 ** abs(log_tcid50)
                 
                 # Calculate TCID50/mL
                 volume_ml = inoculum_volume / 1000
-                tcid50_per_ml = tcid50_dilution_factor / volume_ml
+                tcid50_per_ml = float(calculators.tcid50_per_ml(log_tcid50, inoculum_volume))
+                
+                # PFU conversion (calculate first before saving to history)
+                pfu_equivalent = tcid50_per_ml * calculators.TCID50_TO_PFU
+                pfu_display = calculators.format_titer(pfu_equivalent, "PFU/mL")
+                
+                audit_calculation(
+                    'TCID50',
+                    {'dilution_exps': series_exps, 'positive': series_positive, 'total': series_total,
+                     'volume_ul': inoculum_volume, 'cell_line': tcid_cell_line, 'log_step': d},
+                    {'log10_tcid50_dilution': log_tcid50, 'tcid50_per_ml': tcid50_per_ml,
+                     'pfu_equivalent_per_ml': pfu_equivalent},
+                    method="Spearman-Karber"
+                )
                 
                 # Display result
-                exponent = int(math.floor(math.log10(tcid50_per_ml)))
-                mantissa = tcid50_per_ml / (10 ** exponent)
-                tcid50_display = f"{mantissa:.2f} × 10^{exponent} TCID50/mL"
+                tcid50_display = calculators.format_titer(tcid50_per_ml, "TCID50/mL")
                 
                 st.markdown(f"### TCID50 Titer")
                 st.markdown(f"<h2 style='color: #006400; margin-top: -10px;'>{tcid50_display}</h2>", unsafe_allow_html=True)
                 
-                # PFU conversion (calculate first before saving to history)
-                pfu_equivalent = tcid50_per_ml * 0.7
-                pfu_exp = int(math.floor(math.log10(pfu_equivalent)))
-                pfu_mant = pfu_equivalent / (10 ** pfu_exp)
-                pfu_display = f"{pfu_mant:.2f} × 10^{pfu_exp} PFU/mL"
-                
                 # Save to calculation history
                 st.session_state.calculation_history.append({
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -767,7 +917,9 @@ with tab3:
                     'result': tcid50_display,
                     'pfu_equivalent': pfu_display,
                     'cell_line': tcid_cell_line,
-                    'num_dilutions': num_dilutions
+                    'num_dilutions': num_dilutions,
+                    'volume_ul': inoculum_volume,
+                    'wells_per_dilution': dilution_data[0]['total']
                 })
                 
                 st.info(f"📊 **Approximate PFU equivalent:** {pfu_display} (using 0.7 conversion factor)")
@@ -800,7 +952,14 @@ with tab3:
             # Methods section
             st.subheader("Methods Section")
             
-            methods_text = f"""Viral titers were determined by TCID50 assay using the {calculation_method} method. {tcid_cell_line} cells were seeded in 96-well plates and incubated overnight to reach confluence. Serial 10-fold dilutions of virus stock were prepared, and {inoculum_volume:.0f} µL of each dilution was added to replicate wells ({dilution_data[0]['total']} wells per dilution). Plates were incubated at 37°C with 5% CO₂ and monitored daily for cytopathic effect (CPE). After appropriate incubation, wells were scored as positive (CPE present) or negative (no CPE). The TCID50 was calculated using the {calculation_method} method and expressed as {tcid50_display}."""
+            import methods
+            methods_text = methods.tcid50_methods({
+                'method': calculation_method,
+                'cell_line': tcid_cell_line,
+                'volume_ul': inoculum_volume,
+                'wells_per_dilution': dilution_data[0]['total'],
+                'result': tcid50_display
+            })
             
             st.text_area("Copy for your methods:", methods_text, height=150, key="tcid_methods_area")
             
@@ -813,65 +972,18 @@ with tab3:
                     st.success("✓ Select all (Ctrl+A) and copy (Ctrl+C)")
             
             with col_tcid2:
-                # Generate TCID50 PDF
-                pdf_buffer = io.BytesIO()
-                doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-                story = []
-                styles = getSampleStyleSheet()
-                
-                title_style = ParagraphStyle(
-                    'CustomTitle',
-                    parent=styles['Heading1'],
-                    fontSize=24,
-                    textColor=colors.HexColor('#006400'),
-                    spaceAfter=30,
-                )
-                story.append(Paragraph(f"TCID50 Calculation Report ({calculation_method})", title_style))
-                story.append(Spacer(1, 0.2*inch))
-                
-                story.append(Paragraph(f"<b>TCID50 Titer:</b> {tcid50_display}", styles['Normal']))
-                story.append(Paragraph(f"<b>PFU Equivalent:</b> {pfu_display}", styles['Normal']))
-                story.append(Spacer(1, 0.2*inch))
-                
-                # Dilution data table
-                table_data = [['Dilution', 'Positive', 'Total', '% Positive']]
-                for d in dilution_data:
-                    table_data.append([
-                        f"10^{d['dilution_exp']}",
-                        str(d['positive']),
-                        str(d['total']),
-                        f"{d['percent']:.1f}%"
-                    ])
-                
-                table = Table(table_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige)
-                ]))
-                
-                story.append(table)
-                story.append(Spacer(1, 0.3*inch))
-                
-                story.append(Paragraph("<b>Methods:</b>", styles['Heading2']))
-                story.append(Paragraph(methods_text, styles['Normal']))
-                story.append(Spacer(1, 0.3*inch))
-                story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Italic']))
-                
-                doc.build(story)
-                pdf_buffer.seek(0)
-                
-                st.download_button(
-                    label="📄 Download PDF Report",
-                    data=pdf_buffer,
+                # Generate TCID50 PDF in the background
+                import jobs
+                import reports
+                start_job(
+                    f"TCID50 report ({tcid50_display})", reports.tcid50_report,
+                    calculation_method, tcid50_display, pfu_display, dilution_data, methods_text,
+                    progress=jobs.report_progress,
                     file_name=f"TCID50_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    mime="application/pdf",
-                    use_container_width=True,
-                    key="tcid_pdf_download"
+                    mime="application/pdf"
                 )
+                
+                st.info("📄 PDF report is rendering - download it from **Background Jobs** in the sidebar")
     
     # Example data button
     st.markdown("---")
@@ -885,6 +997,709 @@ with tab3:
         - Clear 50% endpoint around 10⁻⁵
         """)
 
+# ============================================================================
+# TAB 4: PRNT CALCULATOR
+# ============================================================================
+with tab4:
+    st.header("🛡️ PRNT Calculator")
+    st.markdown("Calculate PRNT50/PRNT90 neutralization titers from plaque counts across serum dilutions")
+    
+    prnt_mode = st.radio(
+        "Input Mode",
+        options=["Single Serum", "Batch (CSV)"],
+        horizontal=True,
+        help="Single Serum: enter counts by hand. Batch: upload plaque counts for many sera at once",
+        key="prnt_mode"
+    )
+    
+    # Experimental details shared by both modes
+    col_p1, col_p2, col_p3 = st.columns(3)
+    
+    with col_p1:
+        prnt_cell_line = st.selectbox(
+            "Cell Line",
+            options=CELL_LINES,
+            index=1,
+            key="prnt_cell_line"
+        )
+    
+    with col_p2:
+        prnt_plate_type = st.selectbox(
+            "Plate Type",
+            options=PLATE_TYPES,
+            index=1,
+            key="prnt_plate_type"
+        )
+    
+    with col_p3:
+        prnt_overlay = st.selectbox(
+            "Overlay Medium",
+            options=OVERLAY_TYPES,
+            index=2,
+            key="prnt_overlay"
+        )
+    
+    control_plaques = st.number_input(
+        "Virus-Only Control (mean plaques)",
+        min_value=1.0,
+        value=80.0,
+        step=1.0,
+        help="Mean plaque count of the virus-only control wells (no serum)",
+        key="prnt_control"
+    )
+    
+    prnt_results = None
+    
+    if prnt_mode == "Single Serum":
+        col_s1, col_s2, col_s3 = st.columns(3)
+        
+        with col_s1:
+            prnt_num_dilutions = st.number_input(
+                "Number of Dilutions",
+                min_value=4,
+                max_value=12,
+                value=8,
+                step=1,
+                help="At least 4 dilutions are needed to fit a 4-parameter logistic",
+                key="prnt_num_dilutions"
+            )
+        
+        with col_s2:
+            prnt_start = st.number_input(
+                "Starting Dilution (1:X)",
+                min_value=1,
+                value=10,
+                step=1,
+                help="Reciprocal of the first serum dilution (e.g. 10 for 1:10)",
+                key="prnt_start"
+            )
+        
+        with col_s3:
+            prnt_fold = st.selectbox(
+                "Dilution Step",
+                options=[2, 3, 4, 5, 10],
+                index=0,
+                format_func=lambda x: f"{x}-fold",
+                key="prnt_fold"
+            )
+        
+        st.markdown("**Enter plaque counts for each serum dilution:**")
+        
+        serum_dilutions = []
+        serum_plaques = []
+        
+        for i in range(prnt_num_dilutions):
+            reciprocal = prnt_start * prnt_fold ** i
+            col_d1, col_d2 = st.columns([2, 2])
+            
+            with col_d1:
+                st.markdown(f"1:{reciprocal}")
+            
+            with col_d2:
+                count = st.number_input(
+                    f"Plaques 1:{reciprocal}",
+                    min_value=0,
+                    value=0,
+                    step=1,
+                    key=f"prnt_plaques_{i}",
+                    label_visibility="collapsed"
+                )
+            
+            serum_dilutions.append(reciprocal)
+            serum_plaques.append(count)
+        
+        if st.button("Calculate PRNT Titers", type="primary", key="prnt_calc_button"):
+            import prnt
+            prnt_sample_ids = ["Serum"]
+            prnt_results = prnt.prnt_titers(serum_dilutions, [serum_plaques], control_plaques)
+            prnt_inputs = {'dilutions': [float(x) for x in serum_dilutions], 'plaques': serum_plaques,
+                           'control_plaques': control_plaques}
+    
+    else:
+        st.markdown("""
+        Upload a CSV with columns **sample**, **dilution** (reciprocal, e.g. 40 for 1:40) and **plaques**.
+        Repeated rows are treated as replicate wells. Rows with dilution **0** are that sample's
+        virus-only control wells and override the control value above.
+        """)
+        
+        prnt_file = st.file_uploader("Plaque Count CSV", type=["csv"], key="prnt_upload")
+        
+        if prnt_file is not None and st.button("Calculate PRNT Titers", type="primary", key="prnt_batch_button"):
+            import pandas as pd
+            import prnt
+            upload = pd.read_csv(prnt_file)
+            missing = {'sample', 'dilution', 'plaques'} - set(upload.columns)
+            
+            if missing:
+                st.error(f"❌ Missing column(s): {', '.join(sorted(missing))}")
+            else:
+                prnt_sample_ids, serum_dilutions, counts, controls = prnt.counts_from_long(
+                    upload['sample'], upload['dilution'], upload['plaques']
+                )
+                # Fall back to the shared control where a sample has no control wells
+                controls[:, 0] = pd.Series(controls[:, 0]).fillna(control_plaques).to_numpy()
+                prnt_results = prnt.prnt_titers(serum_dilutions, counts, controls)
+                # The uploaded file is identified by its hash rather than copied into the log
+                import hashlib
+                prnt_inputs = {'source_file': prnt_file.name,
+                               'source_sha256': hashlib.sha256(prnt_file.getvalue()).hexdigest(),
+                               'control_plaques': control_plaques}
+    
+    if prnt_results is not None:
+        audit_calculation(
+            'PRNT', prnt_inputs,
+            {'samples': [str(x) for x in prnt_sample_ids], 'prnt50': list(prnt_results['prnt50_display']),
+             'prnt90': list(prnt_results['prnt90_display']), 'qc': list(prnt_results['qc_flag'])},
+            method="4-parameter logistic"
+        )
+        
+        import pandas as pd
+        st.subheader("Results")
+        
+        summary = pd.DataFrame({
+            'Sample': prnt_sample_ids,
+            'PRNT50': prnt_results['prnt50_display'],
+            'PRNT90': prnt_results['prnt90_display'],
+            'Hill Slope': prnt_results['hill'],
+            'R²': prnt_results['r_squared'],
+            'QC': prnt_results['qc_flag']
+        })
+        
+        n_pass = int(prnt_results['qc_pass'].sum())
+        st.write(f"**Sera analyzed:** {len(summary)} ({n_pass} passed QC)")
+        
+        if len(summary) == 1:
+            prnt50 = summary['PRNT50'].iloc[0]
+            prnt90 = summary['PRNT90'].iloc[0]
+            col_r1, col_r2 = st.columns(2)
+            with col_r1:
+                st.metric("PRNT50 Titer", prnt50)
+            with col_r2:
+                st.metric("PRNT90 Titer", prnt90)
+            
+            if prnt_results['qc_pass'][0]:
+                st.success("✅ Curve fit passed QC")
+            else:
+                st.warning(f"⚠️ {summary['QC'].iloc[0]}")
+        
+        st.dataframe(summary, use_container_width=True)
+        
+        st.download_button(
+            label="📥 Download PRNT Results (CSV)",
+            data=summary.to_csv(index=False),
+            file_name=f"PRNT_Results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            key="prnt_csv_download"
+        )
+        
+        # Save to calculation history
+        for i, sample_id in enumerate(prnt_sample_ids):
+            prnt50 = prnt_results['prnt50_display'][i]
+            prnt90 = prnt_results['prnt90_display'][i]
+            st.session_state.calculation_history.append({
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'type': 'PRNT',
+                'sample': sample_id,
+                'result': f"PRNT50 {prnt50}",
+                'prnt90': prnt90,
+                'cell_line': prnt_cell_line,
+                'plate_type': prnt_plate_type,
+                'overlay': prnt_overlay,
+                'start_dilution': float(serum_dilutions[0]),
+                'fold': float(serum_dilutions[1] / serum_dilutions[0]) if len(serum_dilutions) > 1 else None,
+                'qc': prnt_results['qc_flag'][i]
+            })
+        
+        # Methods section
+        st.subheader("Methods Section")
+        
+        import methods
+        prnt_methods_text = methods.prnt_methods({
+            'start_dilution': serum_dilutions[0],
+            'fold': serum_dilutions[1] / serum_dilutions[0] if len(serum_dilutions) > 1 else None,
+            'cell_line': prnt_cell_line,
+            'plate_type': prnt_plate_type,
+            'overlay': prnt_overlay
+        })
+        
+        st.text_area("Copy for your methods:", prnt_methods_text, height=150, key="prnt_methods_area")
+
+# ============================================================================
+# TAB 5: GROWTH KINETICS
+# ============================================================================
+with tab5:
+    st.header("📈 Growth Kinetics")
+    st.markdown("Analyze multi-timepoint titer series: growth rate, lag and peak titer across strains and conditions")
+    
+    kinetics_input = st.radio(
+        "Data Type",
+        options=["Titers", "PFU Plaque Counts", "TCID50 Well Scores"],
+        horizontal=True,
+        help="Titers: one titer per row. Plaque counts and well scores are converted with the PFU and TCID50 calculators",
+        key="kinetics_input"
+    )
+    
+    kinetics_columns = {
+        "Titers": "**titer** (PFU/mL or TCID50/mL)",
+        "PFU Plaque Counts": "**plaques** and **dilution_exp** (e.g. -6), one plate per row",
+        "TCID50 Well Scores": "**dilution_exp**, **positive** and **total**, one dilution per row",
+    }
+    st.markdown(f"""
+    Upload a CSV with columns **condition**, **replicate**, **time_h** and {kinetics_columns[kinetics_input]}.
+    An optional **volume_ul** column overrides the inoculum volume below.
+    """)
+    
+    col_k1, col_k2 = st.columns(2)
+    
+    with col_k1:
+        kinetics_volume = st.number_input(
+            "Inoculum Volume (µL)",
+            min_value=1.0,
+            value=100.0,
+            step=10.0,
+            disabled=kinetics_input == "Titers",
+            key="kinetics_volume"
+        )
+    
+    with col_k2:
+        kinetics_method = st.radio(
+            "TCID50 Method",
+            options=["Reed-Muench", "Spearman-Karber"],
+            horizontal=True,
+            disabled=kinetics_input != "TCID50 Well Scores",
+            key="kinetics_method"
+        )
+    
+    kinetics_file = st.file_uploader("Growth Curve CSV", type=["csv"], key="kinetics_upload")
+    
+    if kinetics_file is not None:
+        import pandas as pd
+        import growth_kinetics
+        kinetics_rows = pd.read_csv(kinetics_file)
+        required = {
+            "Titers": {'titer'},
+            "PFU Plaque Counts": {'plaques', 'dilution_exp'},
+            "TCID50 Well Scores": {'dilution_exp', 'positive', 'total'},
+        }[kinetics_input] | {'condition', 'replicate', 'time_h'}
+        missing = required - set(kinetics_rows.columns)
+        
+        if missing:
+            st.error(f"❌ Missing column(s): {', '.join(sorted(missing))}")
+        else:
+            volumes = kinetics_rows['volume_ul'].to_numpy() if 'volume_ul' in kinetics_rows else kinetics_volume
+            
+            # Titer for every (condition, replicate, timepoint)
+            if kinetics_input == "Titers":
+                points = kinetics_rows
+                point_titers = kinetics_rows['titer'].to_numpy()
+            elif kinetics_input == "PFU Plaque Counts":
+                points = kinetics_rows
+                point_titers = growth_kinetics.titers_from_plaques(
+                    kinetics_rows['plaques'], kinetics_rows['dilution_exp'], volumes
+                )
+            else:
+                first_rows, point_titers = growth_kinetics.titers_from_wells(
+                    (kinetics_rows['condition'], kinetics_rows['replicate'], kinetics_rows['time_h']),
+                    kinetics_rows['dilution_exp'], kinetics_rows['positive'], kinetics_rows['total'],
+                    volumes, method=kinetics_method
+                )
+                points = kinetics_rows.iloc[first_rows]
+            
+            series = growth_kinetics.pivot_series(
+                points['condition'], points['replicate'], points['time_h'], point_titers
+            )
+            growth_fit = growth_kinetics.fit_growth(series['times'], series['log_titers'])
+            summary = growth_kinetics.summarize_conditions(series['condition'], growth_fit)
+            
+            st.subheader("Results")
+            st.write(f"**Conditions:** {len(summary['condition'])} ({len(series['condition'])} replicate series)")
+            
+            # Mean log10 titer per condition over time
+            curves = pd.DataFrame(series['log_titers'], columns=series['times'])
+            curves['condition'] = series['condition']
+            curves = curves.groupby('condition').mean().T
+            curves.index.name = 'Time (h)'
+            st.line_chart(curves)
+            
+            summary_df = pd.DataFrame({
+                'Condition': summary['condition'],
+                'Replicates': summary['replicates'],
+                'Growth Rate (log10/h)': summary['growth_rate_mean'],
+                'Rate SD': summary['growth_rate_sd'],
+                'Doubling Time (h)': summary['doubling_time_mean'],
+                'Lag (h)': summary['lag_mean'],
+                'Peak (log10)': summary['peak_log_titer_mean'],
+                'Peak SD': summary['peak_log_titer_sd'],
+                'Time to Peak (h)': summary['time_to_peak_mean'],
+                'AUC': summary['auc_mean']
+            })
+            st.dataframe(summary_df, use_container_width=True)
+            
+            # Compare every condition against a reference
+            reference = st.selectbox(
+                "Reference Condition",
+                options=list(summary['condition']),
+                key="kinetics_reference"
+            )
+            comparison = growth_kinetics.compare_conditions(summary, reference)
+            st.dataframe(pd.DataFrame({
+                'Condition': comparison['condition'],
+                'Peak Fold Change': comparison['peak_fold_change'],
+                'Δ Growth Rate (log10/h)': comparison['growth_rate_difference'],
+                'Δ Lag (h)': comparison['lag_difference'],
+                'Δ AUC': comparison['auc_difference']
+            }), use_container_width=True)
+            
+            st.download_button(
+                label="📥 Download Kinetics Summary (CSV)",
+                data=summary_df.to_csv(index=False),
+                file_name=f"Growth_Kinetics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                key="kinetics_csv_download"
+            )
+            
+            if st.button("Save to History", key="kinetics_save"):
+                for i, condition in enumerate(summary['condition']):
+                    st.session_state.calculation_history.append({
+                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'type': 'Growth Kinetics',
+                        'condition': str(condition),
+                        'result': f"Peak 10^{summary['peak_log_titer_mean'][i]:.2f}",
+                        'growth_rate': f"{summary['growth_rate_mean'][i]:.3f} log10/h",
+                        'lag_h': f"{summary['lag_mean'][i]:.1f}",
+                        'replicates': int(summary['replicates'][i])
+                    })
+                st.success(f"✓ Saved {len(summary['condition'])} conditions to history")
+
+# ============================================================================
+# TAB 6: ASSAY DESIGN SIMULATOR
+# ============================================================================
+with tab6:
+    st.header("🎲 Assay Design Simulator")
+    st.markdown("Compare dilution ranges, wells and replicates by simulating thousands of synthetic assays")
+    
+    design_assay = st.radio(
+        "Assay Type",
+        options=["TCID50", "PFU"],
+        horizontal=True,
+        help="TCID50: binomial CPE scoring per well. PFU: Poisson plaque counts per plate",
+        key="design_assay"
+    )
+    
+    col_ds1, col_ds2 = st.columns(2)
+    
+    with col_ds1:
+        expected_range = st.slider(
+            "Expected Titer Range (log10 per mL)",
+            min_value=1.0,
+            max_value=12.0,
+            value=(5.0, 8.0),
+            step=0.5,
+            help="Simulated stocks are drawn uniformly across this range",
+            key="design_range"
+        )
+    
+    with col_ds2:
+        design_sims = st.select_slider(
+            "Simulated Assays per Design",
+            options=[10_000, 100_000, 1_000_000],
+            value=100_000,
+            format_func=lambda x: f"{x:,}",
+            key="design_sims"
+        )
+    
+    col_ds3, col_ds4, col_ds5 = st.columns(3)
+    
+    with col_ds3:
+        design_dilutions = st.multiselect(
+            "Number of Dilutions",
+            options=list(range(3, 11)),
+            default=[4, 6, 8],
+            key="design_dilutions"
+        )
+    
+    with col_ds4:
+        if design_assay == "TCID50":
+            design_sizes = st.multiselect(
+                "Wells per Dilution",
+                options=[2, 3, 4, 5, 6, 8, 10, 12],
+                default=[4, 8],
+                key="design_wells"
+            )
+        else:
+            design_sizes = st.multiselect(
+                "Replicates",
+                options=[1, 2, 3, 4, 5, 6],
+                default=[1, 2, 3],
+                key="design_replicates"
+            )
+    
+    with col_ds5:
+        design_start = st.selectbox(
+            "First Dilution",
+            options=list(range(-1, -11, -1)),
+            index=0,
+            format_func=lambda x: f"10^{x}",
+            key="design_start"
+        )
+    
+    col_ds6, col_ds7 = st.columns(2)
+    
+    with col_ds6:
+        design_volume = st.number_input(
+            "Inoculum Volume (µL)",
+            min_value=1.0,
+            value=100.0,
+            step=10.0,
+            key="design_volume"
+        )
+    
+    with col_ds7:
+        design_method = st.radio(
+            "TCID50 Method",
+            options=["Reed-Muench", "Spearman-Karber"],
+            horizontal=True,
+            disabled=design_assay != "TCID50",
+            key="design_method"
+        )
+    
+    if st.button("Run Simulation", type="primary", key="design_run"):
+        if not design_dilutions or not design_sizes:
+            st.error("❌ Select at least one dilution count and one well/replicate count")
+        else:
+            import assay_simulator
+            import jobs
+            st.session_state.design_job = start_job(
+                f"{design_assay} design simulation ({len(design_dilutions) * len(design_sizes)} designs)",
+                assay_simulator.compare_designs,
+                design_assay, design_sims, expected_range, design_dilutions, design_sizes,
+                start_exp=design_start, volume_ul=design_volume, method=design_method,
+                progress=jobs.report_progress
+            )
+    
+    designs = collect_job("design_job", "Simulating assays")
+    if designs is not None:
+        st.session_state.design_results = designs
+    
+    if st.session_state.get("design_results"):
+        import pandas as pd
+        design_df = pd.DataFrame(st.session_state.design_results).sort_values(['failure_rate', 'rmse_log10'])
+        
+        best = design_df.iloc[0]
+        tcid50_design = 'wells_per_dilution' in design_df
+        size_label = 'wells_per_dilution' if tcid50_design else 'replicates'
+        st.success(
+            f"✅ Best design: {int(best['num_dilutions'])} dilutions × {int(best[size_label])} "
+            f"{'wells' if tcid50_design else 'replicates'} "
+            f"(failure rate {best['failure_rate']:.1%}, RMSE {best['rmse_log10']:.3f} log10)"
+        )
+        
+        st.dataframe(design_df, use_container_width=True, hide_index=True)
+        st.caption(
+            "Errors are log10(estimated / true titer) over assays that produced a titer. "
+            "Failure rates are fractions of all simulated assays."
+        )
+
+# ============================================================================
+# TAB 7: PLATE READER IMPORT
+# ============================================================================
+with tab7:
+    st.header("🔬 Plate Reader Import")
+    st.markdown("Score CPE from plate-reader absorbance or fluorescence exports and calculate TCID50 for every plate")
+    
+    reader_file = st.file_uploader(
+        "Plate Reader Export",
+        type=["csv", "txt", "xlsx"],
+        help="Grid blocks (rows A-H/A-P, columns 1-12/1-24) or a long table with a Well column; multiple plates per file",
+        key="reader_upload"
+    )
+    
+    col_pr1, col_pr2 = st.columns(2)
+    
+    with col_pr1:
+        layout_source = st.radio(
+            "Plate Layout",
+            options=["Default", "Upload Template"],
+            horizontal=True,
+            help="Default: one dilution per row from 10⁻¹, last two columns are cell controls (NC)",
+            key="reader_layout_source"
+        )
+        
+        if layout_source == "Default":
+            reader_plate_size = st.selectbox(
+                "Plate Format",
+                options=[96, 384],
+                format_func=lambda x: f"{x}-well",
+                key="reader_plate_size"
+            )
+            # Built on Score so the first render does not load numpy
+            reader_layout = None
+        else:
+            layout_file = st.file_uploader(
+                "Layout Template (CSV)",
+                type=["csv"],
+                help="Plate-shaped grid: dilution exponents (-3 or S1:-3), NC/CC negative controls, PC/VC positive controls, blank = unused",
+                key="reader_layout_upload"
+            )
+            reader_layout = None
+            if layout_file is not None:
+                import plate_reader
+                try:
+                    reader_layout = plate_reader.parse_layout(plate_reader.iter_rows(layout_file))
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+    
+    with col_pr2:
+        reader_direction = st.radio(
+            "Positive Wells Have",
+            options=["below", "above"],
+            format_func=lambda x: "Lower signal (CPE, e.g. crystal violet)" if x == "below" else "Higher signal (e.g. reporter fluorescence)",
+            key="reader_direction"
+        )
+    
+    col_pr3, col_pr4, col_pr5 = st.columns(3)
+    
+    with col_pr3:
+        reader_cutoff = st.selectbox(
+            "Cutoff",
+            options=["threshold", "control_sd", "control_midpoint"],
+            format_func=lambda x: {
+                "threshold": "Fixed threshold",
+                "control_sd": "Per-plate: NC mean ± k·SD",
+                "control_midpoint": "Per-plate: NC/PC midpoint"
+            }[x],
+            key="reader_cutoff"
+        )
+    
+    with col_pr4:
+        if reader_cutoff == "threshold":
+            reader_threshold = st.number_input("Threshold", value=0.5, step=0.05, format="%.3f", key="reader_threshold")
+            reader_k = 3.0
+        else:
+            reader_threshold = None
+            reader_k = st.number_input("k (SDs)", min_value=0.5, value=3.0, step=0.5, key="reader_k",
+                                       disabled=reader_cutoff != "control_sd")
+    
+    with col_pr5:
+        reader_volume = st.number_input("Inoculum Volume (µL)", min_value=1.0, value=100.0, step=10.0, key="reader_volume")
+    
+    reader_method = st.radio(
+        "TCID50 Method",
+        options=["Reed-Muench", "Spearman-Karber"],
+        horizontal=True,
+        key="reader_method"
+    )
+    
+    if st.button("Score Plates", type="primary", key="reader_score",
+                 disabled=reader_file is None or (layout_source != "Default" and reader_layout is None)):
+        import io
+        import jobs
+        import plate_reader
+        if reader_layout is None:
+            reader_layout = plate_reader.default_layout(reader_plate_size)
+        # Audited when the job's results are collected
+        import hashlib
+        st.session_state.reader_audit = {
+            'source_file': reader_file.name,
+            'source_sha256': hashlib.sha256(reader_file.getvalue()).hexdigest(),
+            'volume_ul': reader_volume, 'cutoff': reader_cutoff, 'threshold': reader_threshold,
+            'k': reader_k, 'direction': reader_direction,
+            'layout': {key: value.tolist() for key, value in reader_layout.items()}
+        }, reader_method
+        # A copy of the upload, so the job does not share the widget's file handle
+        st.session_state.reader_job = start_job(
+            f"Plate reader: {reader_file.name}", plate_reader.titrate_file,
+            io.BytesIO(reader_file.getvalue()), reader_layout, reader_volume, filename=reader_file.name,
+            progress=jobs.report_progress, method=reader_method, cutoff=reader_cutoff,
+            threshold=reader_threshold, k=reader_k, direction=reader_direction
+        )
+    
+    scored = collect_job("reader_job", "Scoring plates")
+    if scored is not None:
+        reader_inputs, scored_method = st.session_state.reader_audit
+        audit_calculation(
+            'TCID50', reader_inputs,
+            {'plates': scored['plates'], 'samples': [str(x) for x in scored['samples']],
+             'tcid50_per_ml': scored['tcid50_per_ml'].tolist()},
+            method=f"{scored_method} (plate reader)"
+        )
+        st.session_state.plate_results = scored
+    
+    plate_results = st.session_state.get("plate_results")
+    
+    if plate_results is not None:
+        import numpy as np
+        import pandas as pd
+        import calculators
+        st.subheader("Results")
+        
+        rows = []
+        for p, plate_name in enumerate(plate_results['plates']):
+            for s, sample in enumerate(plate_results['samples']):
+                titer = plate_results['tcid50_per_ml'][p, s]
+                rows.append({
+                    'Plate': plate_name,
+                    'Sample': sample,
+                    'Cutoff': plate_results['cutoffs'][p],
+                    'TCID50/mL': calculators.format_titer(titer, "TCID50/mL") if not math.isnan(titer) else "No 50% endpoint",
+                    'Positive Wells': int(np.nansum(plate_results['positive'][p, s])),
+                    'Total Wells': int(np.nansum(plate_results['total'][p, s]))
+                })
+        
+        st.write(f"**Plates scored:** {len(plate_results['plates'])}")
+        reader_df = pd.DataFrame(rows)
+        st.dataframe(reader_df, use_container_width=True, hide_index=True)
+        
+        st.download_button(
+            label="📥 Download Plate Results (CSV)",
+            data=reader_df.to_csv(index=False),
+            file_name=f"Plate_Reader_TCID50_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            key="reader_csv_download"
+        )
+        
+        # Send one plate/sample to the TCID50 tab for the full report
+        reader_choice = st.selectbox(
+            "Send to TCID50 Calculator",
+            options=range(len(rows)),
+            format_func=lambda i: f"{rows[i]['Plate']} - {rows[i]['Sample']}",
+            key="reader_send_choice"
+        )
+        
+        def load_into_tcid50(index, method, volume):
+            p, s = divmod(index, len(plate_results['samples']))
+            exps = plate_results['dilution_exp'][p, s]
+            keep = np.flatnonzero(np.isfinite(exps))[:10]
+            st.session_state.tcid_num_dilutions = max(3, len(keep))
+            for i, j in enumerate(keep):
+                st.session_state[f"tcid_dilution_{i}"] = int(max(exps[j], -10))
+                st.session_state[f"tcid_positive_{i}"] = int(plate_results['positive'][p, s, j])
+                st.session_state[f"tcid_total_{i}"] = max(1, int(plate_results['total'][p, s, j]))
+            st.session_state.tcid_method = method
+            st.session_state.tcid_volume = volume
+        
+        st.button(
+            "🧬 Load into TCID50 Calculator",
+            key="reader_send",
+            on_click=load_into_tcid50,
+            args=(reader_choice, reader_method, reader_volume)
+        )
+
+# Background jobs panel goes last so jobs submitted during this run are listed
+if st.session_state.background_jobs:
+    import jobs
+    watching = [j['id'] for j in st.session_state.background_jobs
+                if (jobs.status(j['id']) or {}).get('state') in jobs.ACTIVE_STATES]
+    with st.sidebar:
+        st.markdown("---")
+        if hasattr(st, "fragment"):
+            # Poll progress once a second while jobs are active, without rerunning the tabs
+            st.fragment(run_every=1.0 if watching else None)(render_jobs)(watching)
+        else:
+            render_jobs()
+            if watching:
+                st.button("🔄 Refresh", key="jobs_refresh")
+
 # Footer
 st.markdown("---")
 st.markdown("*Developed for streamlining virology workflows*")
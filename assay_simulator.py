@@ -0,0 +1,138 @@
+"""Monte Carlo simulation of titration assay designs.
+
+Synthetic assays are drawn across an expected titer range, scored the way a
+real plate would be (binomial CPE wells, Poisson plaque counts) and run
+through the same calculators as the TCID50 and PFU tabs. Each design is
+simulated as one (assays, dilutions) array, in chunks to bound memory, so
+millions of simulated assays take seconds.
+"""
+import math
+
+import numpy as np
+
+import calculators
+
+# Simulated assays per vectorized chunk (bounds peak memory)
+CHUNK_SIZE = 250_000
+
+
+def _chunks(n_sims):
+    for start in range(0, n_sims, CHUNK_SIZE):
+        yield min(CHUNK_SIZE, n_sims - start)
+
+
+def _true_log_titers(rng, size, log_titer_range):
+    low, high = log_titer_range
+    return rng.uniform(low, high, size)
+
+
+def _summarize(errors, failures, n_sims):
+    # errors: log10(estimated / true) for assays that produced a titer
+    errors = np.concatenate(errors) if errors else np.empty(0)
+    summary = {
+        'simulated': n_sims,
+        'bias_log10': float(errors.mean()) if errors.size else math.nan,
+        'sd_log10': float(errors.std(ddof=1)) if errors.size > 1 else math.nan,
+        'rmse_log10': float(np.sqrt(np.mean(errors ** 2))) if errors.size else math.nan,
+        'within_0_5_log10': float(np.mean(np.abs(errors) <= 0.5)) if errors.size else math.nan,
+    }
+    for name, count in failures.items():
+        summary[f"{name}_rate"] = count / n_sims
+    summary['failure_rate'] = 1 - errors.size / n_sims
+    return summary
+
+
+def simulate_tcid50(n_sims, log_titer_range, num_dilutions, wells, start_exp=-1,
+                    volume_ul=100.0, method="Reed-Muench", seed=None):
+    # 10-fold series from 10^start_exp; each well is infected with probability
+    # 1 - exp(-λ), where λ = ln2 at exactly one TCID50 per well
+    rng = np.random.default_rng(seed)
+    exps = start_exp - np.arange(num_dilutions)
+    volume_ml = volume_ul / 1000
+    errors = []
+    failures = {'all_negative': 0, 'all_positive': 0, 'no_transition': 0}
+
+    for size in _chunks(n_sims):
+        true_log = _true_log_titers(rng, size, log_titer_range)
+        log_units = true_log[:, None] + math.log10(volume_ml) + exps[None, :]
+        p_positive = -np.expm1(-math.log(2) * 10.0 ** log_units)
+        positive = rng.binomial(wells, p_positive)
+
+        all_negative = (positive == 0).all(axis=1)
+        all_positive = (positive == wells).all(axis=1)
+        if method == "Reed-Muench":
+            log_dilution = calculators.reed_muench(exps, positive, wells)['log_dilution']
+            no_transition = ~np.isfinite(log_dilution) & ~all_negative & ~all_positive
+        else:
+            log_dilution = calculators.spearman_karber(exps, positive, wells)['log_dilution']
+            # Spearman-Karber assumes 100% at the first and 0% at the last dilution
+            no_transition = ((positive[:, 0] < wells) | (positive[:, -1] > 0)) & ~all_negative & ~all_positive
+
+        ok = ~(all_negative | all_positive | no_transition)
+        estimate = np.log10(calculators.tcid50_per_ml(log_dilution[ok], volume_ul))
+        errors.append(estimate - true_log[ok])
+        failures['all_negative'] += int(all_negative.sum())
+        failures['all_positive'] += int(all_positive.sum())
+        failures['no_transition'] += int(no_transition.sum())
+
+    return _summarize(errors, failures, n_sims)
+
+
+def simulate_pfu(n_sims, log_titer_range, num_dilutions, replicates, start_exp=-1,
+                 volume_ul=100.0, seed=None):
+    # Every dilution is plated in replicate; the titer comes from the least
+    # dilute dilution whose mean count is within the countable range
+    rng = np.random.default_rng(seed)
+    exps = start_exp - np.arange(num_dilutions)
+    volume_ml = volume_ul / 1000
+    errors = []
+    failures = {'too_many_to_count': 0, 'too_few_to_count': 0, 'between_dilutions': 0}
+
+    for size in _chunks(n_sims):
+        true_log = _true_log_titers(rng, size, log_titer_range)
+        expected = 10.0 ** (true_log[:, None] + math.log10(volume_ml) + exps[None, :])
+        counts = rng.poisson(expected[:, :, None], size=(size, num_dilutions, replicates))
+        mean_counts = counts.mean(axis=2)
+
+        countable = calculators.is_countable(mean_counts)
+        ok = countable.any(axis=1)
+        chosen = countable.argmax(axis=1)
+        rows = np.flatnonzero(ok)
+        estimate = calculators.pfu_per_ml(
+            mean_counts[rows, chosen[rows]], 10.0 ** np.abs(exps[chosen[rows]]), volume_ul
+        )
+        errors.append(np.log10(estimate) - true_log[rows])
+
+        # Uncountable: every plate confluent, every plate too sparse, or the
+        # countable window falls between two consecutive dilutions
+        too_many = ~ok & (mean_counts[:, -1] > calculators.COUNTABLE_MAX)
+        too_few = ~ok & (mean_counts[:, 0] < calculators.COUNTABLE_MIN)
+        failures['too_many_to_count'] += int(too_many.sum())
+        failures['too_few_to_count'] += int(too_few.sum())
+        failures['between_dilutions'] += int((~ok & ~too_many & ~too_few).sum())
+
+    return _summarize(errors, failures, n_sims)
+
+
+def compare_designs(assay, n_sims, log_titer_range, num_dilutions_options, size_options,
+                    start_exp=-1, volume_ul=100.0, method="Reed-Muench", seed=None, progress=None):
+    # Simulate every combination of dilution count and wells (TCID50) or
+    # replicates (PFU); returns one summary dict per design.
+    # progress(fraction) is called after each design.
+    n_designs = len(num_dilutions_options) * len(size_options)
+    results = []
+    for num_dilutions in num_dilutions_options:
+        for size in size_options:
+            if assay == "TCID50":
+                summary = simulate_tcid50(n_sims, log_titer_range, num_dilutions, size,
+                                          start_exp, volume_ul, method, seed)
+                design = {'num_dilutions': num_dilutions, 'wells_per_dilution': size}
+            else:
+                summary = simulate_pfu(n_sims, log_titer_range, num_dilutions, size,
+                                       start_exp, volume_ul, seed)
+                design = {'num_dilutions': num_dilutions, 'replicates': size}
+            design.update(summary)
+            results.append(design)
+            if progress is not None:
+                progress(len(results) / n_designs)
+    return results
@@ -0,0 +1,247 @@
+"""Append-only, hash-chained audit log of calculations.
+
+Every record is one JSON line whose last field is a SHA-256 hash over the
+previous record's hash and the record's own bytes, so editing, inserting,
+reordering or deleting a record breaks the chain for every record after it.
+The log is separate from the session history and nothing in the app removes
+or rewrites it; the only bytes ever dropped are a torn final line left by a
+crash mid-write, a record whose caller was never told it had been written.
+
+Writes go through a single writer thread with group commit: records queued
+while the previous batch is being flushed are written together and share one
+fsync, so concurrent sessions do not each pay for a disk flush.
+
+Records cut off the end leave a valid (shorter) chain, so they are caught by
+checking against a chain head noted earlier, e.g. kept off the server. Verify
+a log (streams the file; memory use does not grow with its length):
+    python audit.py verify [path] [--expect-seq N --expect-hash HASH]
+"""
+import argparse
+import getpass
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+AUDIT_PATH = os.environ.get("TITER_AUDIT_LOG", "audit_log.jsonl")
+
+GENESIS_HASH = "0" * 64
+
+# Records written per group commit at most
+MAX_BATCH = 1024
+
+# Every line ends with this field; the hash covers the line with it removed
+_HASH_PREFIX = b', "hash": "'
+_SUFFIX_LENGTH = len(_HASH_PREFIX) + 64 + 2  # prefix + hex digest + '"}'
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_tails = {}
+
+
+class AuditError(Exception):
+    pass
+
+
+def default_user():
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "unknown"
+
+
+def _chain_hash(prev_hash, payload):
+    return hashlib.sha256(prev_hash.encode() + payload).hexdigest()
+
+
+def _read_tail(path):
+    # (seq, hash, end) of the last complete record, reading backwards from the
+    # end of the file. `end` is short of the file size when a crash mid-write
+    # left a torn final line; that record was never acknowledged to a caller.
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0, GENESIS_HASH, 0
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        start = f.tell()
+        block = b""
+        while start > 0 and block.count(b"\n") < 2:
+            chunk_start = max(0, start - 65536)
+            f.seek(chunk_start)
+            block = f.read(start - chunk_start) + block
+            start = chunk_start
+    complete = block[:block.rfind(b"\n") + 1]
+    end = start + len(complete)
+    last = complete.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    if not last:
+        return 0, GENESIS_HASH, end
+
+    seq = None
+    if len(last) > _SUFFIX_LENGTH and last[-_SUFFIX_LENGTH:-_SUFFIX_LENGTH + len(_HASH_PREFIX)] == _HASH_PREFIX:
+        try:
+            seq = json.loads(last)['seq']
+        except (ValueError, KeyError, TypeError):
+            pass
+    if seq is None:
+        # A complete but unreadable line is damage, not an interrupted write
+        raise AuditError(f"{path}: the last record (ending at byte {end}) is malformed; "
+                         "check the log with 'python audit.py verify'")
+    return seq, last[-_SUFFIX_LENGTH + len(_HASH_PREFIX):-2].decode(), end
+
+
+def _encode(seq, prev_hash, event):
+    payload = json.dumps({'seq': seq, **event}, sort_keys=True, ensure_ascii=False, default=str).encode()
+    digest = _chain_hash(prev_hash, payload)
+    return payload[:-1] + _HASH_PREFIX + digest.encode() + b'"}\n', digest
+
+
+def _commit(path, items):
+    # Append one batch under an exclusive lock with a single fsync
+    with open(path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Another process may have appended since our last batch
+            size = os.fstat(f.fileno()).st_size
+            seq, prev_hash, known_size = _tails.get(path, (None, None, None))
+            if known_size != size:
+                seq, prev_hash, end = _read_tail(path)
+                if end < size:
+                    # Drop a torn record left by a crash so the chain continues
+                    # from the last complete one
+                    f.truncate(end)
+
+            lines = []
+            for event, done, box in items:
+                seq += 1
+                line, prev_hash = _encode(seq, prev_hash, event)
+                lines.append(line)
+                box['seq'], box['hash'] = seq, prev_hash
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+            _tails[path] = (seq, prev_hash, f.tell())
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _writer_loop():
+    while True:
+        batch = [_queue.get()]
+        # Everything that queued up during the last fsync goes into this commit
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        by_path = {}
+        for path, event, done, box in batch:
+            by_path.setdefault(path, []).append((event, done, box))
+        for path, items in by_path.items():
+            try:
+                _commit(path, items)
+            except Exception as e:
+                for _, _, box in items:
+                    box['error'] = e
+            for _, done, _ in items:
+                done.set()
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="audit-writer", daemon=True)
+            _writer.start()
+
+
+def record(calculation, inputs, outputs, method=None, app_version=None, user=None,
+           path=AUDIT_PATH, wait=True):
+    # Queue one calculation for the log; with wait=True, returns its (seq, hash)
+    # once it is on disk and raises if the write failed
+    event = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='microseconds'),
+        'calculation': calculation,
+        'method': method,
+        'inputs': inputs,
+        'outputs': outputs,
+        'app_version': app_version,
+        'user': user or default_user(),
+    }
+    done, box = threading.Event(), {}
+    _ensure_writer()
+    _queue.put((path, event, done, box))
+    if not wait:
+        return None
+    done.wait()
+    if 'error' in box:
+        raise box['error']
+    return box['seq'], box['hash']
+
+
+def verify(path=AUDIT_PATH, progress=None, progress_every=100_000, expect_seq=None, expect_hash=None):
+    # Stream the log and check every link of the hash chain. The chain alone
+    # cannot show that records were cut off the end, so a head noted earlier
+    # (expect_seq, expect_hash) can be given: that record must still be there.
+    prev_hash = GENESIS_HASH
+    entries = 0
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip(b"\n")
+            if not line:
+                continue
+            if len(line) <= _SUFFIX_LENGTH or line[-_SUFFIX_LENGTH:-_SUFFIX_LENGTH + len(_HASH_PREFIX)] != _HASH_PREFIX:
+                return {'ok': False, 'entries': entries, 'line': line_number, 'reason': "malformed record"}
+            stored = line[-_SUFFIX_LENGTH + len(_HASH_PREFIX):-2].decode()
+            payload = line[:-_SUFFIX_LENGTH] + b"}"
+            if _chain_hash(prev_hash, payload) != stored:
+                return {'ok': False, 'entries': entries, 'line': line_number,
+                        'reason': "hash mismatch (record altered, inserted, removed or reordered)"}
+            prev_hash = stored
+            entries += 1
+            if entries == expect_seq and expect_hash is not None and stored != expect_hash:
+                return {'ok': False, 'entries': entries - 1, 'line': line_number,
+                        'reason': f"record {expect_seq} does not match the expected chain head"}
+            if progress is not None and entries % progress_every == 0:
+                progress(entries)
+    if expect_seq is not None and entries < expect_seq:
+        return {'ok': False, 'entries': entries, 'line': None,
+                'reason': f"log ends at record {entries} but record {expect_seq} was expected (records removed from the end)"}
+    return {'ok': True, 'entries': entries, 'line': None, 'reason': None, 'last_hash': prev_hash}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the hash chain of an audit log")
+    parser.add_argument("command", choices=["verify"])
+    parser.add_argument("path", nargs="?", default=AUDIT_PATH)
+    parser.add_argument("--expect-seq", type=int, help="Record number of a chain head noted earlier")
+    parser.add_argument("--expect-hash", help="Hash of that record, as printed by an earlier verify")
+    args = parser.parse_args(argv)
+    if (args.expect_seq is None) != (args.expect_hash is None):
+        parser.error("--expect-seq and --expect-hash go together")
+
+    result = verify(args.path, expect_seq=args.expect_seq, expect_hash=args.expect_hash)
+    if result['ok']:
+        print(f"OK: {result['entries']} record(s), chain head {result['last_hash']}")
+        print(f"To detect records later removed from the end: "
+              f"--expect-seq {result['entries']} --expect-hash {result['last_hash']}")
+        return 0
+    if result['line'] is None:
+        print(f"FAILED: {result['reason']}")
+    else:
+        print(f"FAILED at line {result['line']}: {result['reason']} ({result['entries']} record(s) verified before it)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Measures, each in a fresh interpreter:
+  - import time: executing app.py's top-level imports
+  - time to first render: a full headless run of app.py (streamlit AppTest)
+
+and checks that the first render did not load the heavy libraries that are
+meant to be imported on demand. Exits non-zero when a budget is exceeded, so
+it can run as a CI step:
+
+    python benchmark_startup.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Seconds (median of runs); generous enough for a loaded CI runner
+IMPORT_BUDGET_S = 0.8
+FIRST_RENDER_BUDGET_S = 1.5
+
+# Must not be imported until a calculation, upload or report needs them
+DEFERRED_MODULES = ("numpy", "pandas", "reportlab")
+
+_IMPORT_SCRIPT = """
+import ast, json, sys, time
+tree = ast.parse(open(sys.argv[1], encoding="utf-8").read())
+imports = ast.Module([n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))], [])
+start = time.perf_counter()
+exec(compile(imports, sys.argv[1], "exec"), {})
+print(json.dumps({'seconds': time.perf_counter() - start}))
+"""
+
+_RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+deferred = sys.argv[2].split(",")
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+seconds = time.perf_counter() - start
+print(json.dumps({
+    'seconds': seconds,
+    'exceptions': [str(e.value) for e in at.exception],
+    'loaded': [m for m in deferred if m in sys.modules],
+}))
+"""
+
+
+def _run(script, *args):
+    # Fresh interpreter per measurement so nothing is already in sys.modules
+    out = subprocess.run(
+        [sys.executable, "-c", script, *args], capture_output=True, text=True,
+        cwd=os.path.dirname(APP_PATH), check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(runs=3):
+    import_times = [_run(_IMPORT_SCRIPT, APP_PATH)['seconds'] for _ in range(runs)]
+    renders = [_run(_RENDER_SCRIPT, APP_PATH, ",".join(DEFERRED_MODULES)) for _ in range(runs)]
+    return {
+        'import_s': statistics.median(import_times),
+        'first_render_s': statistics.median(r['seconds'] for r in renders),
+        'exceptions': renders[-1]['exceptions'],
+        'loaded': renders[-1]['loaded'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check app cold-start time against its budget")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh-process runs per measurement (median is used)")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_S)
+    parser.add_argument("--render-budget", type=float, default=FIRST_RENDER_BUDGET_S)
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    failures = []
+    if result['import_s'] > args.import_budget:
+        failures.append(f"import time {result['import_s']:.3f}s exceeds {args.import_budget:.3f}s")
+    if result['first_render_s'] > args.render_budget:
+        failures.append(f"first render {result['first_render_s']:.3f}s exceeds {args.render_budget:.3f}s")
+    if result['exceptions']:
+        failures.append(f"first render raised: {'; '.join(result['exceptions'])}")
+    if result['loaded']:
+        failures.append(f"loaded on first render: {', '.join(result['loaded'])}")
+
+    print(f"Import time:     {result['import_s']:.3f}s (budget {args.import_budget:.3f}s)")
+    print(f"First render:    {result['first_render_s']:.3f}s (budget {args.render_budget:.3f}s)")
+    print(f"Deferred loaded: {', '.join(result['loaded']) or 'none'}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Titer calculations shared by the calculator tabs and batch modules.
+
+Every function accepts scalars or numpy arrays. Dilution-series functions
+operate along the last axis, so a single assay and a stack of thousands of
+assays go through the same code path.
+"""
+import math
+
+import numpy as np
+
+# Approximate PFU per TCID50 (Poisson: 1 TCID50 ~ 0.69 infectious units)
+TCID50_TO_PFU = 0.7
+
+# Optimal plaque count range for a countable plate
+COUNTABLE_MIN = 30
+COUNTABLE_MAX = 300
+
+
+def pfu_per_ml(plaques, dilution_factor, volume_ul):
+    # PFU/mL = (plaques × dilution factor) / volume plated (mL)
+    volume_ml = np.asarray(volume_ul, dtype=float) / 1000
+    return np.asarray(plaques, dtype=float) * np.asarray(dilution_factor, dtype=float) / volume_ml
+
+
+def is_countable(plaques):
+    plaques = np.asarray(plaques)
+    return (plaques >= COUNTABLE_MIN) & (plaques <= COUNTABLE_MAX)
+
+
+def rank_within(group):
+    # Running count of each group id in row order, e.g. [4, 7, 4, 4] -> [0, 0, 1, 2];
+    # used to give repeated rows (replicates, dilutions) their own slot in a stack
+    group = np.asarray(group)
+    order = np.argsort(group, kind='stable')
+    starts = np.r_[0, np.flatnonzero(np.diff(group[order])) + 1]
+    rank_sorted = np.arange(len(group)) - np.repeat(starts, np.diff(np.r_[starts, len(group)]))
+    rank = np.empty(len(group), dtype=int)
+    rank[order] = rank_sorted
+    return rank
+
+
+def _sorted_series(dilution_exps, positive, total):
+    # Order each series from least to most dilute (10^-1 before 10^-6)
+    dilution_exps = np.asarray(dilution_exps, dtype=float)
+    positive = np.asarray(positive, dtype=float)
+    total = np.asarray(total, dtype=float)
+    dilution_exps, positive, total = np.broadcast_arrays(dilution_exps, positive, total)
+
+    order = np.argsort(-dilution_exps, axis=-1, kind='stable')
+    dilution_exps = np.take_along_axis(dilution_exps, order, axis=-1)
+    positive = np.take_along_axis(positive, order, axis=-1)
+    total = np.take_along_axis(total, order, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.where(total > 0, positive / total * 100, np.nan)
+    return dilution_exps, positive, total, percent
+
+
+def reed_muench(dilution_exps, positive, total):
+    # Reed & Muench (1938): infected wells are accumulated from the most dilute
+    # dilution upward (a well infected at 10^-4 would be at 10^-3 too) and
+    # uninfected wells from the least dilute downward. The 50% endpoint is
+    # interpolated between the most dilute dilution whose cumulative percent
+    # infected is >= 50% and the next dilution. Returns a dict of arrays; the
+    # log10 TCID50 dilution is NaN where the series has no 50% transition.
+    dilution_exps, positive, total, _ = _sorted_series(dilution_exps, positive, total)
+    observed = total > 0
+    infected = np.where(observed, positive, 0.0)
+    uninfected = np.where(observed, total - positive, 0.0)
+    cum_infected = np.cumsum(infected[..., ::-1], axis=-1)[..., ::-1]
+    cum_uninfected = np.cumsum(uninfected, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.where(observed, cum_infected / (cum_infected + cum_uninfected) * 100, np.nan)
+    n = percent.shape[-1]
+
+    at_or_above = percent >= 50
+    any_above = at_or_above.any(axis=-1)
+    # Index of the last (most dilute) dilution at or above 50%
+    idx_above = n - 1 - np.argmax(at_or_above[..., ::-1], axis=-1)
+    valid = any_above & (idx_above < n - 1)
+    idx_above = np.where(valid, idx_above, 0)
+    idx_below = np.where(valid, idx_above + 1, 0)
+
+    def _at(values, idx):
+        return np.take_along_axis(values, idx[..., None], axis=-1)[..., 0]
+
+    exp_above, exp_below = _at(dilution_exps, idx_above), _at(dilution_exps, idx_below)
+    percent_above, percent_below = _at(percent, idx_above), _at(percent, idx_below)
+    valid &= np.isfinite(percent_below)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportionate_distance = (percent_above - 50) / (percent_above - percent_below)
+        log_dilution = exp_above + proportionate_distance * (exp_below - exp_above)
+
+    nan = np.nan
+    return {
+        'log_dilution': np.where(valid, log_dilution, nan),
+        'proportionate_distance': np.where(valid, proportionate_distance, nan),
+        'exp_above': np.where(valid, exp_above, nan),
+        'exp_below': np.where(valid, exp_below, nan),
+        'percent_above': np.where(valid, percent_above, nan),
+        'percent_below': np.where(valid, percent_below, nan),
+    }
+
+
+def spearman_karber(dilution_exps, positive, total, log_step=1):
+    # log10 TCID50 = x0 - d(S - 0.5), x0 = least dilute exponent, S = sum of proportions
+    dilution_exps, positive, total, percent = _sorted_series(dilution_exps, positive, total)
+    proportions = percent / 100
+    sum_proportions = np.nansum(proportions, axis=-1)
+    x0 = dilution_exps[..., 0]
+    return {
+        'log_dilution': x0 - log_step * (sum_proportions - 0.5),
+        'sum_proportions': sum_proportions,
+        'x0': x0,
+    }
+
+
+def tcid50_per_ml(log_dilution, volume_ul):
+    volume_ml = np.asarray(volume_ul, dtype=float) / 1000
+    return 10 ** np.abs(np.asarray(log_dilution, dtype=float)) / volume_ml
+
+
+def format_titer(value, unit):
+    # Scientific notation for display, e.g. "5.00 × 10^8 PFU/mL"
+    if not value > 0:
+        return f"0 {unit}"
+    exponent = int(math.floor(math.log10(value)))
+    mantissa = value / (10 ** exponent)
+    return f"{mantissa:.2f} × 10^{exponent} {unit}"
@@ -0,0 +1,179 @@
+"""Viral growth kinetics from multi-timepoint titer series.
+
+Titers for every (condition, replicate, timepoint) are computed with the same
+calculators the PFU and TCID50 tabs use, then every replicate series is
+analyzed at once as a (series, timepoints) array: growth rate from the
+steepest sliding-window regression of log10 titer on time, lag from where that
+line leaves the starting titer, and peak titer with its time.
+"""
+import numpy as np
+
+import calculators
+
+# Timepoints per sliding window when estimating the exponential growth rate
+GROWTH_WINDOW = 3
+
+
+def _group_index(*keys):
+    # Integer id per unique combination of keys, plus the first row of each group
+    stacked = np.rec.fromarrays([np.asarray(k).astype(str) for k in keys])
+    _, first_row, group = np.unique(stacked, return_index=True, return_inverse=True)
+    return group.ravel(), first_row
+
+
+def titers_from_plaques(plaques, dilution_exps, volume_ul):
+    # One PFU/mL per row (plate)
+    return calculators.pfu_per_ml(plaques, 10.0 ** np.abs(np.asarray(dilution_exps, dtype=float)), volume_ul)
+
+
+def titers_from_wells(point_keys, dilution_exps, positive, total, volume_ul, method="Reed-Muench"):
+    # Rows are single dilutions; rows sharing a point key form one TCID50 series.
+    # Series are padded with NaN into a (points, dilutions) stack and calculated together.
+    group, first_row = _group_index(*point_keys)
+    n_points = len(first_row)
+    slot = calculators.rank_within(group)
+    shape = (n_points, slot.max() + 1)
+
+    def _stack(values):
+        out = np.full(shape, np.nan)
+        out[group, slot] = np.asarray(values, dtype=float)
+        return out
+
+    exps, pos, tot = _stack(dilution_exps), _stack(positive), _stack(total)
+    if method == "Reed-Muench":
+        log_dilution = calculators.reed_muench(exps, pos, tot)['log_dilution']
+    else:
+        log_dilution = calculators.spearman_karber(exps, pos, tot)['log_dilution']
+
+    volume = np.broadcast_to(np.asarray(volume_ul, dtype=float), group.shape)[first_row]
+    return first_row, calculators.tcid50_per_ml(log_dilution, volume)
+
+
+def pivot_series(conditions, replicates, times, titers):
+    # Long rows -> (series, timepoints) log10 titers on a shared time grid.
+    # Replicate measurements at the same timepoint are averaged in log space.
+    conditions = np.asarray(conditions).astype(str)
+    series, first_row = _group_index(conditions, replicates)
+    time_grid, time_idx = np.unique(np.asarray(times, dtype=float), return_inverse=True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_titers = np.where(np.asarray(titers, dtype=float) > 0, np.log10(np.asarray(titers, dtype=float)), np.nan)
+    observed = np.isfinite(log_titers)
+
+    shape = (len(first_row), len(time_grid))
+    total = np.zeros(shape)
+    count = np.zeros(shape)
+    np.add.at(total, (series[observed], time_idx[observed]), log_titers[observed])
+    np.add.at(count, (series[observed], time_idx[observed]), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(count > 0, total / count, np.nan)
+
+    return {
+        'condition': conditions[first_row],
+        'replicate': np.asarray(replicates).astype(str)[first_row],
+        'times': time_grid,
+        'log_titers': values,
+    }
+
+
+def fit_growth(times, log_titers, window=GROWTH_WINDOW):
+    # times: (timepoints,); log_titers: (series, timepoints) with NaN for missing points
+    y = np.atleast_2d(np.asarray(log_titers, dtype=float))
+    t = np.broadcast_to(np.asarray(times, dtype=float), y.shape)
+    mask = np.isfinite(y)
+    n_series, n_times = y.shape
+    rows = np.arange(n_series)
+
+    # Starting titer: first observed timepoint
+    has_data = mask.any(axis=1)
+    first = mask.argmax(axis=1)
+    initial = np.where(has_data, y[rows, first], np.nan)
+    initial_time = np.where(has_data, t[rows, first], np.nan)
+
+    # Peak titer and when it was reached
+    y_masked = np.where(mask, y, -np.inf)
+    peak_idx = y_masked.argmax(axis=1)
+    peak = np.where(has_data, y[rows, peak_idx], np.nan)
+    time_to_peak = np.where(has_data, t[rows, peak_idx], np.nan)
+
+    # Steepest least-squares slope over consecutive windows of timepoints;
+    # a single timepoint has no slope, so rate, lag and doubling time stay NaN
+    rate = np.full(n_series, np.nan)
+    intercept = np.full(n_series, np.nan)
+    if n_times >= 2:
+        window = max(2, min(window, n_times))
+        w_t = np.lib.stride_tricks.sliding_window_view(t, window, axis=1)
+        w_y = np.lib.stride_tricks.sliding_window_view(np.where(mask, y, 0.0), window, axis=1)
+        w_m = np.lib.stride_tricks.sliding_window_view(mask, window, axis=1).astype(float)
+        n = w_m.sum(axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_t = (w_m * w_t).sum(axis=2) / n
+            mean_y = (w_m * w_y).sum(axis=2) / n
+            dt = w_t - mean_t[..., None]
+            var_t = (w_m * dt ** 2).sum(axis=2)
+            slope = (w_m * dt * (w_y - mean_y[..., None])).sum(axis=2) / var_t
+        slope = np.where((n >= 2) & (var_t > 0), slope, np.nan)
+
+        best = np.where(np.isfinite(slope), slope, -np.inf).argmax(axis=1)
+        rate = slope[rows, best]
+        intercept = mean_y[rows, best] - rate * mean_t[rows, best]
+    growing = np.isfinite(rate) & (rate > 0)
+    rate = np.where(growing, rate, np.nan)
+
+    # Lag: time at which the exponential-phase line rises from the starting titer
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lag = np.where(growing, np.maximum((initial - intercept) / rate, initial_time), np.nan)
+        doubling_time = np.log10(2) / rate
+
+    # Area under the log10 titer curve: trapezoids between consecutive observed points
+    order = np.argsort(~mask, axis=1, kind='stable')
+    t_obs = np.take_along_axis(np.where(mask, t, np.nan), order, axis=1)
+    y_obs = np.take_along_axis(np.where(mask, y, np.nan), order, axis=1)
+    segments = 0.5 * (y_obs[:, 1:] + y_obs[:, :-1]) * (t_obs[:, 1:] - t_obs[:, :-1])
+    auc = np.nansum(segments, axis=1)
+
+    return {
+        'initial_log_titer': initial,
+        'peak_log_titer': peak,
+        'time_to_peak': time_to_peak,
+        'growth_rate': rate,
+        'doubling_time': doubling_time,
+        'lag': lag,
+        'auc': np.where(has_data, auc, np.nan),
+    }
+
+
+def summarize_conditions(conditions, fit):
+    # Mean and SD of each fitted parameter across the replicates of each condition
+    labels, group = np.unique(np.asarray(conditions).astype(str), return_inverse=True)
+    summary = {'condition': labels, 'replicates': np.bincount(group, minlength=len(labels))}
+
+    for name, values in fit.items():
+        values = np.asarray(values, dtype=float)
+        ok = np.isfinite(values)
+        count = np.bincount(group[ok], minlength=len(labels)).astype(float)
+        total = np.bincount(group[ok], weights=values[ok], minlength=len(labels))
+        squares = np.bincount(group[ok], weights=values[ok] ** 2, minlength=len(labels))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            var = (squares - count * mean ** 2) / (count - 1)
+        summary[f"{name}_mean"] = np.where(count > 0, mean, np.nan)
+        summary[f"{name}_sd"] = np.where(count > 1, np.sqrt(np.maximum(var, 0)), np.nan)
+
+    return summary
+
+
+def compare_conditions(summary, reference):
+    # Differences of every condition against a reference condition
+    ref = np.flatnonzero(summary['condition'] == reference)
+    if len(ref) == 0:
+        raise ValueError(f"Unknown reference condition: {reference}")
+    ref = ref[0]
+
+    return {
+        'condition': summary['condition'],
+        'peak_fold_change': 10.0 ** (summary['peak_log_titer_mean'] - summary['peak_log_titer_mean'][ref]),
+        'growth_rate_difference': summary['growth_rate_mean'] - summary['growth_rate_mean'][ref],
+        'lag_difference': summary['lag_mean'] - summary['lag_mean'][ref],
+        'auc_difference': summary['auc_mean'] - summary['auc_mean'][ref],
+    }
@@ -0,0 +1,46 @@
+"""Persistent calculation history shared by the app and the ingestion service.
+
+History rows are the same dicts the app keeps in
+``st.session_state.calculation_history``, stored one JSON object per line so
+writers only ever append. Standard library only, so the app can check for
+new rows without loading numpy or pandas.
+"""
+import csv
+import io
+import json
+import os
+
+HISTORY_PATH = os.environ.get("TITER_INGEST_HISTORY", "ingest_history.jsonl")
+
+
+def read_history(path=HISTORY_PATH, offset=0):
+    # History rows from line `offset` on; returns (rows, next offset)
+    if not os.path.exists(path):
+        return [], offset
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if i >= offset and line.strip():
+                rows.append(json.loads(line))
+    return rows, offset + len(rows)
+
+
+def append_history(path, rows):
+    with open(path, "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def export_csv(rows, progress=None, chunk_size=10_000):
+    # Columns are every key in first-seen order, like a DataFrame of the rows
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, restval="", extrasaction="ignore")
+    writer.writeheader()
+    for start in range(0, len(rows), chunk_size):
+        writer.writerows(rows[start:start + chunk_size])
+        if progress is not None:
+            progress(min(start + chunk_size, len(rows)) / len(rows))
+    return buffer.getvalue()
@@ -0,0 +1,184 @@
+"""Inverted index over the calculation history for faceted search.
+
+History rows are indexed incrementally as they are appended: each facet value
+and each word of the free-text fields maps to the ascending list of row ids
+that contain it, and titers and timestamps are kept as columns for range
+filters. A query ORs the postings within a facet, ANDs across facets and the
+ranges with numpy masks, and returns only the requested page of row ids, so
+searches stay interactive over hundreds of thousands of rows.
+"""
+import re
+
+import numpy as np
+
+# Facets offered as filters; 'type' and 'method' are split out of history
+# types like "TCID50 (Reed-Muench)"
+FACETS = ('type', 'method', 'cell_line', 'overlay', 'plate_type')
+
+# Fields whose words are searchable as free text
+TEXT_FIELDS = ('type', 'cell_line', 'sample', 'condition', 'plate', 'source_file')
+
+PAGE_SIZE = 25
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+_SCIENTIFIC = re.compile(r"(\d+(?:\.\d+)?) × 10\^(-?\d+)")
+_LOG_PEAK = re.compile(r"^Peak 10\^(-?\d+(?:\.\d+)?)")
+
+
+def new_index():
+    return {
+        'size': 0,
+        'postings': {field: {} for field in FACETS + ('text',)},
+        'titers': np.empty(0),
+        'timestamps': np.empty(0, dtype='datetime64[s]'),
+        '_arrays': {},
+        '_tokens': {},
+        '_last': None,
+    }
+
+
+def _facets(row):
+    # Facet values of one history row
+    calc_type = str(row.get('type', 'N/A'))
+    method = row.get('method')
+    if " (" in calc_type and calc_type.endswith(")"):
+        calc_type, suffix = calc_type[:-1].split(" (", 1)
+        method = method or suffix
+    return {
+        'type': calc_type,
+        'method': method,
+        'cell_line': row.get('cell_line'),
+        'overlay': row.get('overlay'),
+        'plate_type': row.get('plate_type'),
+    }
+
+
+def parse_titer(result):
+    # Numeric titer from a formatted result ("5.00 × 10^8 PFU/mL", "Peak 10^6.20"); NaN otherwise
+    result = str(result)
+    match = _SCIENTIFIC.search(result)
+    if match:
+        return float(match.group(1)) * 10.0 ** int(match.group(2))
+    match = _LOG_PEAK.match(result)
+    if match:
+        return 10.0 ** float(match.group(1))
+    return np.nan
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def _datetimes(values):
+    try:
+        return np.asarray(values, dtype='datetime64[s]')
+    except ValueError:
+        # A malformed timestamp only loses that row from date filters
+        out = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[s]')
+        for i, value in enumerate(values):
+            try:
+                out[i] = np.datetime64(value, 's')
+            except ValueError:
+                pass
+        return out
+
+
+def update_index(index, rows):
+    # Index rows appended since the last update. Rows are known by position, so
+    # a history that shrank, or whose last indexed row has changed (cleared and
+    # refilled), is rebuilt from scratch.
+    size = index['size']
+    if len(rows) < size or (size and rows[size - 1] != index['_last']):
+        index.update(new_index())
+    start = index['size']
+    if start == len(rows):
+        return index
+
+    postings = index['postings']
+    token_cache = index['_tokens']
+    touched = set()
+    titers, timestamps = [], []
+    for row_id in range(start, len(rows)):
+        row = rows[row_id]
+        for field, value in _facets(row).items():
+            if value is not None:
+                postings[field].setdefault(str(value), []).append(row_id)
+                touched.add((field, str(value)))
+        tokens = set()
+        for field in TEXT_FIELDS:
+            value = row.get(field)
+            if value is not None:
+                # Sample names, plates and files repeat, so tokenize each string once
+                value = str(value)
+                if value not in token_cache:
+                    token_cache[value] = tokenize(value)
+                tokens.update(token_cache[value])
+        for token in tokens:
+            postings['text'].setdefault(token, []).append(row_id)
+            touched.add(('text', token))
+        titers.append(parse_titer(row.get('result', '')))
+        timestamps.append(str(row.get('timestamp', '')))
+
+    # Columns grow by the new rows; only postings that changed drop their cached array
+    index['titers'] = np.concatenate([index['titers'], np.asarray(titers, dtype=float)])
+    index['timestamps'] = np.concatenate([index['timestamps'], _datetimes(timestamps)])
+    for key in touched:
+        index['_arrays'].pop(key, None)
+    index['size'] = len(rows)
+    index['_last'] = rows[-1]
+    return index
+
+
+def _posting(index, field, value):
+    # Postings as numpy arrays, cached until an update appends to them
+    arrays = index['_arrays']
+    if (field, value) not in arrays:
+        ids = index['postings'][field].get(value, [])
+        arrays[(field, value)] = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    return arrays[(field, value)]
+
+
+def facet_values(index, field):
+    # (value, row count) pairs for a facet, most common first
+    counts = [(value, len(ids)) for value, ids in index['postings'][field].items()]
+    return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+
+def search(index, filters=None, text="", titer_range=None, date_range=None, page=0, page_size=PAGE_SIZE):
+    # filters: {facet: [values]}; titer_range: (low, high) titers; date_range: (start, end)
+    # dates, inclusive. Returns the total match count and one page of row ids, newest first.
+    n = index['size']
+    mask = np.ones(n, dtype=bool)
+
+    def _require(ids):
+        keep = np.zeros(n, dtype=bool)
+        keep[ids] = True
+        mask[:] &= keep
+
+    for field, values in (filters or {}).items():
+        if values:
+            _require(np.concatenate([_posting(index, field, str(v)) for v in values]))
+
+    for token in tokenize(text):
+        _require(_posting(index, 'text', token))
+
+    if titer_range is not None:
+        titers = index['titers']
+        low, high = titer_range
+        with np.errstate(invalid='ignore'):
+            mask &= (titers >= low) & (titers <= high)
+
+    if date_range is not None:
+        stamps = index['timestamps']
+        start, end = date_range
+        mask &= (stamps >= np.datetime64(start, 's')) & (stamps < np.datetime64(end, 'D') + np.timedelta64(1, 'D'))
+
+    matches = np.flatnonzero(mask)[::-1]
+    pages = max(1, -(-len(matches) // page_size))
+    page = min(max(page, 0), pages - 1)
+    return {
+        'total': len(matches),
+        'pages': pages,
+        'page': page,
+        'ids': matches[page * page_size:(page + 1) * page_size].tolist(),
+    }
@@ -0,0 +1,333 @@
+"""Watch-folder ingestion service.
+
+Polls a directory (e.g. a network share that imagers and plate readers drop
+files into), titrates each new or changed file on a worker pool and appends
+the results to a persistent JSON Lines history that the app can load.
+
+Files are tracked in a checkpoint keyed by path with their mtime, size and
+SHA-256. Unchanged files are skipped on the mtime/size fast path; touched but
+identical files are caught by the hash. The checkpoint is only advanced after
+a file's results are in the history, and the hashes already present in the
+history are honoured on startup, so a restart never reprocesses a file. Each
+file's results are written to the audit log (audit.py) before the history.
+
+Usage:
+    python ingest.py /mnt/share/titers --workers 4 --poll 5
+"""
+import argparse
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import audit
+import calculators
+import plate_reader
+from history import HISTORY_PATH, append_history, read_history
+
+CHECKPOINT_PATH = os.environ.get("TITER_INGEST_CHECKPOINT", ".ingest_checkpoint.json")
+
+FILE_EXTENSIONS = (".csv", ".txt", ".xlsx", ".xlsm")
+
+# Seconds a file must be left untouched before it is read (still being copied)
+SETTLE_SECONDS = 2.0
+MAX_RETRIES = 3
+RETRY_BACKOFF = 5.0
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {'files': {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _is_pfu_table(path):
+    # PFU tables are CSVs with a plaques column; anything else is a plate-reader export
+    if not path.lower().endswith((".csv", ".txt")):
+        return False
+    with open(path, encoding="utf-8-sig") as f:
+        header = f.readline().lower()
+    return "plaques" in [c.strip() for c in header.replace(";", ",").replace("\t", ",").split(",")]
+
+
+def _pfu_rows(path, options):
+    import pandas as pd
+
+    table = pd.read_csv(path, sep=None, engine="python")
+    if 'dilution_exp' in table:
+        dilution = 10.0 ** np.abs(table['dilution_exp'].to_numpy(dtype=float))
+    elif 'dilution' in table:
+        # Plaque assays are ten-fold series; a dilution of 20 or 0 is some other
+        # table (e.g. a PRNT upload of reciprocal serum dilutions)
+        dilution = table['dilution'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exps = np.log10(dilution)
+        if not (np.isfinite(exps) & (exps >= 1) & np.isclose(exps, np.round(exps))).all():
+            raise ValueError("PFU table dilution must be a power of 10 (10, 100, ...); "
+                             "use a dilution_exp column otherwise")
+    else:
+        raise ValueError("PFU table needs a dilution_exp or dilution column")
+    volume = table['volume_ul'].to_numpy(dtype=float) if 'volume_ul' in table else options['volume_ul']
+    plaques = table['plaques'].to_numpy(dtype=float)
+    titers = calculators.pfu_per_ml(plaques, dilution, volume)
+    volume = np.broadcast_to(volume, titers.shape)
+
+    rows = []
+    for i, titer in enumerate(titers):
+        row = {
+            'type': 'PFU',
+            'plaques': int(plaques[i]),
+            'dilution': f"10^-{int(round(np.log10(dilution[i])))}",
+            'volume_ul': float(volume[i]),
+            'result': calculators.format_titer(titer, "PFU/mL"),
+            'countability': 'Valid' if calculators.is_countable(plaques[i]) else 'Warning'
+        }
+        for column in ('sample', 'cell_line'):
+            if column in table:
+                row[column] = str(table[column].iloc[i])
+        rows.append(row)
+    return rows
+
+
+def _plate_rows(path, options):
+    results = plate_reader.titrate_file(
+        path, options['layout'], options['volume_ul'], method=options['method'],
+        cutoff=options['cutoff'], threshold=options['threshold'], k=options['k'],
+        direction=options['direction']
+    )
+    rows = []
+    for p, plate in enumerate(results['plates']):
+        for s, sample in enumerate(results['samples']):
+            titer = results['tcid50_per_ml'][p, s]
+            rows.append({
+                'type': f"TCID50 ({options['method']})",
+                'plate': plate,
+                'sample': sample,
+                'volume_ul': options['volume_ul'],
+                'result': calculators.format_titer(titer, "TCID50/mL") if np.isfinite(titer) else "No 50% endpoint",
+                'positive_wells': int(np.nansum(results['positive'][p, s])),
+                'total_wells': int(np.nansum(results['total'][p, s]))
+            })
+    return rows
+
+
+def process_file(path, known_hashes, options):
+    # Runs on a worker: hash first, skip content that is already in the history
+    digest = sha256_file(path)
+    if digest in known_hashes:
+        return digest, None
+
+    rows = _pfu_rows(path, options) if _is_pfu_table(path) else _plate_rows(path, options)
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for row in rows:
+        row['timestamp'] = timestamp
+        row['source_file'] = os.path.basename(path)
+        row['source_sha256'] = digest
+    return digest, rows
+
+
+def audit_file(path, digest, rows, options, audit_path=audit.AUDIT_PATH):
+    # One audit record per file, written before its results go into the history
+    inputs = {'source_file': os.path.basename(path), 'source_sha256': digest}
+    if rows[0]['type'] == 'PFU':
+        calculation, method = 'PFU', "Plaque assay (watch folder)"
+    else:
+        calculation, method = 'TCID50', f"{options['method']} (watch folder)"
+        inputs.update({key: options[key] for key in ('volume_ul', 'cutoff', 'threshold', 'k', 'direction')})
+        inputs['layout'] = {key: value.tolist() for key, value in options['layout'].items()}
+    skip = ('timestamp', 'source_file', 'source_sha256')
+    outputs = {'results': [{k: v for k, v in row.items() if k not in skip} for row in rows]}
+    audit.record(calculation, inputs, outputs, method, path=audit_path)
+
+
+def scan(folder):
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(FILE_EXTENSIONS) and not entry.name.startswith("."):
+            yield entry.path, entry.stat()
+
+
+def _due(entry, stat, now):
+    # Whether a file needs (re)processing according to its checkpoint entry
+    if now - stat.st_mtime < SETTLE_SECONDS:
+        return False
+    if entry is None:
+        return True
+    if entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+        return True
+    return entry['status'] == 'retry' and now >= entry['next_attempt']
+
+
+def run(folder, history_path=HISTORY_PATH, checkpoint_path=CHECKPOINT_PATH, workers=4,
+        poll_interval=5.0, max_pending=None, max_retries=MAX_RETRIES, once=False,
+        options=None, log=print, audit_path=audit.AUDIT_PATH):
+    options = options or default_options()
+    max_pending = max_pending or workers * 2
+    checkpoint = load_checkpoint(checkpoint_path)
+    files = checkpoint['files']
+
+    # Content already in the history counts as processed, even if the
+    # checkpoint was not saved before the last shutdown
+    known_hashes = {entry['sha256'] for entry in files.values() if entry.get('status') == 'done'}
+    known_hashes |= {row.get('source_sha256') for row in read_history(history_path)[0]}
+    known_hashes.discard(None)
+
+    stopping = []
+    if hasattr(signal, "SIGTERM"):
+        try:
+            signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        except ValueError:
+            pass  # not the main thread
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while not stopping:
+                now = time.time()
+
+                # Collect finished work and advance the checkpoint, saved once per poll
+                finished = [f for f in pending if f.done()]
+                for future in finished:
+                    path, stat = pending.pop(future)
+                    entry = files.get(path, {'attempts': 0})
+                    entry.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+                    try:
+                        digest, rows = future.result()
+                        if rows:
+                            audit_file(path, digest, rows, options, audit_path)
+                    except Exception as e:
+                        entry['attempts'] = entry.get('attempts', 0) + 1
+                        # A file that does not parse fails the same way every time;
+                        # it is picked up again only once it changes on disk
+                        if isinstance(e, ValueError) or entry['attempts'] >= max_retries:
+                            entry['status'] = 'failed'
+                            log(f"FAILED {os.path.basename(path)}: {e}")
+                        else:
+                            entry['status'] = 'retry'
+                            entry['next_attempt'] = now + RETRY_BACKOFF * 2 ** (entry['attempts'] - 1)
+                            log(f"Retrying {os.path.basename(path)} ({entry['attempts']}/{max_retries}): {e}")
+                        entry['error'] = str(e)
+                    else:
+                        if rows:
+                            append_history(history_path, rows)
+                            log(f"Ingested {os.path.basename(path)}: {len(rows)} result(s)")
+                        known_hashes.add(digest)
+                        entry.update({'sha256': digest, 'status': 'done', 'attempts': 0})
+                        entry.pop('error', None)
+                    files[path] = entry
+                if finished:
+                    save_checkpoint(checkpoint_path, checkpoint)
+
+                # Queue new or changed files; stop when the pool is saturated (back-pressure)
+                in_flight = {path for path, _ in pending.values()}
+                submitted = 0
+                for path, stat in scan(folder):
+                    if len(pending) >= max_pending:
+                        break
+                    if path in in_flight or not _due(files.get(path), stat, now):
+                        continue
+                    pending[pool.submit(process_file, path, frozenset(known_hashes), options)] = (path, stat)
+                    submitted += 1
+
+                if once and not pending and not submitted:
+                    break
+                time.sleep(poll_interval if not pending else min(poll_interval, 0.2))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Let in-flight files finish so their results are not lost
+            for future, (path, stat) in pending.items():
+                try:
+                    digest, rows = future.result()
+                    if rows:
+                        audit_file(path, digest, rows, options, audit_path)
+                except Exception:
+                    continue
+                if rows:
+                    append_history(history_path, rows)
+                files[path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': digest,
+                               'status': 'done', 'attempts': 0}
+            save_checkpoint(checkpoint_path, checkpoint)
+
+
+def default_options():
+    return {
+        'layout': plate_reader.default_layout(96),
+        'volume_ul': 100.0,
+        'method': "Reed-Muench",
+        'cutoff': "control_sd",
+        'threshold': None,
+        'k': 3.0,
+        'direction': "below",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a folder and titrate new plate-reader and PFU files")
+    parser.add_argument("folder", help="Directory to watch")
+    parser.add_argument("--history", default=HISTORY_PATH, help="JSON Lines history to append results to")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file of processed files")
+    parser.add_argument("--audit-log", default=audit.AUDIT_PATH, help="Audit log every calculation is recorded in")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--poll", type=float, default=5.0, help="Seconds between folder scans")
+    parser.add_argument("--max-pending", type=int, default=None, help="Files queued at once (default 2 × workers)")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--once", action="store_true", help="Process what is there and exit")
+    parser.add_argument("--layout", help="Plate layout template CSV (default: one dilution per row)")
+    parser.add_argument("--plate-size", type=int, choices=[96, 384], default=96)
+    parser.add_argument("--volume", type=float, default=100.0, help="Inoculum volume (µL)")
+    parser.add_argument("--method", choices=["Reed-Muench", "Spearman-Karber"], default="Reed-Muench")
+    parser.add_argument("--cutoff", choices=["threshold", "control_sd", "control_midpoint"], default="control_sd")
+    parser.add_argument("--threshold", type=float)
+    parser.add_argument("--k", type=float, default=3.0)
+    parser.add_argument("--direction", choices=["below", "above"], default="below")
+    args = parser.parse_args(argv)
+
+    if args.cutoff == "threshold" and args.threshold is None:
+        parser.error("--cutoff threshold requires --threshold")
+
+    if args.layout:
+        layout = plate_reader.parse_layout(plate_reader.iter_rows(args.layout))
+    else:
+        layout = plate_reader.default_layout(args.plate_size)
+
+    options = {
+        'layout': layout,
+        'volume_ul': args.volume,
+        'method': args.method,
+        'cutoff': args.cutoff,
+        'threshold': args.threshold,
+        'k': args.k,
+        'direction': args.direction,
+    }
+    print(f"Watching {args.folder} ({args.workers} workers, history: {args.history})")
+    run(args.folder, args.history, args.checkpoint, args.workers, args.poll, args.max_pending,
+        args.retries, args.once, options, audit_path=args.audit_log)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Background jobs for slow work (PDF reports, exports, batch titrations).
+
+Jobs run on small shared thread pools, outside the Streamlit script thread,
+so the UI stays responsive while they render. Short jobs (reports, exports)
+and long ones (simulations, batch titrations) have separate pools, so a long
+simulation never holds up anyone's PDF. Each job gets an id that the app keeps
+in session state; status, progress and results live here at module level and
+therefore survive reruns.
+
+Job functions are plain functions. To report progress (and to be
+cancellable while running) they accept a `progress` callback, which the app
+passes as `jobs.report_progress`: called from inside a job it records the
+fraction done and raises JobCancelled once the job has been cancelled.
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Worker threads per pool, shared by every session
+JOB_WORKERS = int(os.environ.get("TITER_JOB_WORKERS", "2"))
+REPORT_WORKERS = int(os.environ.get("TITER_REPORT_WORKERS", "2"))
+
+# Queued + running jobs accepted per session (back-pressure); finished jobs
+# kept per session, so a busy session never evicts another one's downloads
+MAX_ACTIVE = 8
+MAX_FINISHED = 50
+
+ACTIVE_STATES = ("queued", "running")
+
+# kind -> pool: "report" for short jobs, "batch" for long-running ones
+_pools = {
+    'report': ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="titer-report"),
+    'batch': ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="titer-job"),
+}
+_lock = threading.Lock()
+_jobs = {}
+_ids = itertools.count(1)
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run(job, fn, args, kwargs):
+    with _lock:
+        if job['cancel_requested']:
+            job['state'] = 'cancelled'
+            job['finished'] = datetime.now()
+            return
+        job['state'] = 'running'
+        job['started'] = datetime.now()
+
+    _current.job = job
+    try:
+        value = fn(*args, **kwargs)
+    except JobCancelled:
+        state, value, error = 'cancelled', None, None
+    except Exception as e:
+        state, value, error = 'failed', None, f"{type(e).__name__}: {e}"
+    else:
+        state, error = 'done', None
+    finally:
+        _current.job = None
+
+    with _lock:
+        job.update({'state': state, 'result': value, 'error': error, 'finished': datetime.now()})
+        if state == 'done':
+            job['progress'] = 1.0
+        _prune()
+
+
+def _prune():
+    # Drop each session's oldest finished jobs beyond MAX_FINISHED (caller holds _lock)
+    finished = {}
+    for job_id, job in _jobs.items():
+        if job['state'] not in ACTIVE_STATES:
+            finished.setdefault(job['session'], []).append(job_id)
+    for job_ids in finished.values():
+        for job_id in job_ids[:max(0, len(job_ids) - MAX_FINISHED)]:
+            del _jobs[job_id]
+
+
+def submit(label, fn, *args, session=None, kind="batch", **kwargs):
+    # Queue fn(*args, **kwargs) on the `kind` pool; returns the job id. The
+    # active-job cap counts only jobs submitted with the same session.
+    pool = _pools[kind]
+    with _lock:
+        active = sum(job['state'] in ACTIVE_STATES and job['session'] == session for job in _jobs.values())
+        if active >= MAX_ACTIVE:
+            raise RuntimeError(f"{active} jobs are already queued or running; try again when some have finished")
+        job_id = f"job-{next(_ids)}"
+        job = {
+            'id': job_id,
+            'label': label,
+            'session': session,
+            'kind': kind,
+            'state': 'queued',
+            'progress': 0.0,
+            'message': "",
+            'result': None,
+            'error': None,
+            'cancel_requested': False,
+            'submitted': datetime.now(),
+            'started': None,
+            'finished': None,
+        }
+        _jobs[job_id] = job
+        job['future'] = pool.submit(_run, job, fn, args, kwargs)
+    return job_id
+
+
+def report_progress(fraction, message=None):
+    # Called from inside a running job (fraction None when the total is
+    # unknown); a no-op anywhere else
+    job = getattr(_current, "job", None)
+    if job is None:
+        return
+    if fraction is not None:
+        job['progress'] = min(max(float(fraction), 0.0), 1.0)
+    if message is not None:
+        job['message'] = message
+    if job['cancel_requested']:
+        raise JobCancelled()
+
+
+def status(job_id):
+    # Snapshot of a job without its result, or None if unknown/pruned
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k not in ('result', 'future')}
+
+
+def result(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if job['state'] != 'done':
+            raise RuntimeError(f"Job {job_id} is {job['state']}")
+        return job['result']
+
+
+def cancel(job_id):
+    # Queued jobs never start; running jobs stop at their next progress report
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job['state'] not in ACTIVE_STATES:
+            return False
+        job['cancel_requested'] = True
+        if job['future'].cancel():
+            job['state'] = 'cancelled'
+            job['finished'] = datetime.now()
+            _prune()
+        return True
+
+
+def forget(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None and job['state'] not in ACTIVE_STATES:
+            del _jobs[job_id]
@@ -0,0 +1,386 @@
+"""Methods sections for single calculations and for batches of assays.
+
+Each assay type has a protocol template, compiled once at import into
+literal/field parts. A single calculation renders its paragraph directly
+(the PFU, TCID50 and PRNT tabs). A batch (e.g. the calculation history) is
+grouped by protocol: every distinct protocol is described once, the
+parameters that differ between protocols are summarized, and per-assay
+values go into tables. Output is plain text, Markdown or a .docx document
+(written with the standard library).
+"""
+import io
+import re
+import string
+import zipfile
+from xml.sax.saxutils import escape
+
+NOT_RECORDED = "[not recorded]"
+
+# Protocol templates (str.format syntax)
+PFU_PROTOCOL = (
+    "Viral titers were determined by plaque assay on {cell_line} cells. Confluent cell monolayers in "
+    "{plate_types} were prepared 24 hours prior to infection. Serial 10-fold dilutions of virus stocks were "
+    "prepared in infection medium, and {volume_ul} µL of each dilution was inoculated onto the cells"
+    "{replicate_text}. After 1 hour adsorption at 37°C with 5% CO₂, the inoculum was removed and cells were "
+    "overlaid with {overlay_lower}. Plates were incubated at 37°C with 5% CO₂ for {incubation_days} days "
+    "({incubation_hours} hours). Following incubation, cells were fixed with 4% formaldehyde and stained with "
+    "0.1% crystal violet to visualize plaques."
+)
+PFU_RESULT = (
+    " Plaques from the 10⁻{dilution_exp} dilution were manually counted ({plaques} plaques{per_well}), and "
+    "viral titers were calculated as {result}."
+)
+PFU_BATCH_RESULT = (
+    " Plaques were manually counted{counted_range}, and titers were calculated as "
+    "PFU/mL = plaques × dilution factor / volume plated ({count}; {table}).{outside_range}"
+)
+# Only claimed when every assay in the group had a countable plate
+PFU_COUNTED_RANGE = " on plates with 30-300 plaques"
+PFU_OUTSIDE_RANGE = " Counts for {outside} of these fell outside the countable range of 30-300 plaques."
+
+TCID50_PROTOCOL = (
+    "Viral titers were determined by TCID50 assay using the {method} method. {cell_line} cells were seeded in "
+    "96-well plates and incubated overnight to reach confluence. Serial 10-fold dilutions of virus stock were "
+    "prepared, and {volume_ul} µL of each dilution was added to replicate wells ({wells_per_dilution} wells "
+    "per dilution). Plates were incubated at 37°C with 5% CO₂ and monitored daily for cytopathic effect (CPE). "
+    "After appropriate incubation, wells were scored as positive (CPE present) or negative (no CPE)."
+)
+TCID50_RESULT = " The TCID50 was calculated using the {method} method and expressed as {result}."
+TCID50_BATCH_RESULT = (
+    " The TCID50 was calculated using the {method} method and expressed as TCID50/mL ({count}; {table})."
+)
+
+PRNT_PROTOCOL = (
+    "Neutralizing antibody titers were determined by plaque reduction neutralization test (PRNT). Serial "
+    "{fold_text}dilutions of heat-inactivated serum starting at 1:{start_dilution} were mixed with an equal volume "
+    "of virus and incubated for 1 hour at 37°C. Virus-serum mixtures were inoculated onto confluent {cell_line} "
+    "monolayers in {plate_types} and overlaid with {overlay_lower}. Plaques were counted and percent "
+    "neutralization was calculated relative to virus-only control wells. PRNT50 and PRNT90 titers were "
+    "interpolated from a four-parameter logistic fit of percent neutralization against log10 reciprocal serum "
+    "dilution."
+)
+PRNT_BATCH_RESULT = " Titers of {count} are listed in {table}."
+
+# Per assay type: title, protocol fields (grouping key) with labels, and table columns
+ASSAYS = {
+    'PFU': {
+        'title': "Plaque assay",
+        'protocol': {'cell_line': "cell line", 'plate_type': "plate type", 'volume_ul': "inoculum volume (µL)",
+                     'replicates': "replicates", 'overlay': "overlay", 'incubation_hours': "incubation (h)"},
+        'columns': {'sample': "Sample", 'timestamp': "Date", 'dilution_exp': "Dilution (10⁻ˣ)",
+                    'plaques': "Plaques", 'result': "Titer"},
+    },
+    'TCID50': {
+        'title': "TCID50 assay",
+        'protocol': {'method': "calculation method", 'cell_line': "cell line", 'volume_ul': "inoculum volume (µL)",
+                     'wells_per_dilution': "wells per dilution"},
+        'columns': {'sample': "Sample", 'timestamp': "Date", 'num_dilutions': "Dilutions", 'result': "Titer"},
+    },
+    'PRNT': {
+        'title': "Plaque reduction neutralization test",
+        'protocol': {'cell_line': "cell line", 'plate_type': "plate type", 'overlay': "overlay",
+                     'start_dilution': "starting dilution", 'fold': "dilution fold"},
+        'columns': {'sample': "Serum", 'timestamp': "Date", 'result': "PRNT50", 'prnt90': "PRNT90", 'qc': "QC"},
+    },
+}
+
+
+def compile_template(source):
+    # Parse once into (literal, field, format spec) parts; rendering is then a join
+    return tuple((literal, field, spec or "") for literal, field, spec, _ in string.Formatter().parse(source))
+
+
+def render(compiled, fields):
+    out = []
+    for literal, field, spec in compiled:
+        out.append(literal)
+        if field is not None:
+            out.append(format(fields[field], spec))
+    return "".join(out)
+
+
+_TEMPLATES = {
+    'PFU': compile_template(PFU_PROTOCOL),
+    'PFU_RESULT': compile_template(PFU_RESULT),
+    'PFU_BATCH': compile_template(PFU_BATCH_RESULT),
+    'PFU_OUTSIDE': compile_template(PFU_OUTSIDE_RANGE),
+    'TCID50': compile_template(TCID50_PROTOCOL),
+    'TCID50_RESULT': compile_template(TCID50_RESULT),
+    'TCID50_BATCH': compile_template(TCID50_BATCH_RESULT),
+    'PRNT': compile_template(PRNT_PROTOCOL),
+    'PRNT_BATCH': compile_template(PRNT_BATCH_RESULT),
+}
+
+
+def _number(value):
+    # 100.0 -> "100", 2.5 -> "2.5"
+    return f"{value:.0f}" if float(value).is_integer() else f"{value:g}"
+
+
+def _fields(assay, params):
+    # Template fields from recorded parameters; missing ones read as NOT_RECORDED
+    fields = {name: NOT_RECORDED for name in ASSAYS[assay]['protocol']}
+    fields.update({k: v for k, v in params.items() if v is not None and v != ""})
+
+    if 'volume_ul' in params and params['volume_ul'] not in (None, ""):
+        fields['volume_ul'] = _number(float(params['volume_ul']))
+    if 'plate_type' in fields:
+        fields['plate_types'] = fields['plate_type'] + "s" if fields['plate_type'] != NOT_RECORDED else NOT_RECORDED
+    if 'overlay' in fields:
+        fields['overlay_lower'] = fields['overlay'].lower() if fields['overlay'] != NOT_RECORDED else NOT_RECORDED
+
+    if assay == 'PFU':
+        replicates = params.get('replicates')
+        replicates = int(replicates) if replicates not in (None, "") else 1
+        fields['replicate_text'] = (" in duplicate" if replicates == 2 else " in triplicate" if replicates == 3
+                                    else f" with {replicates} replicates" if replicates > 1 else "")
+        fields['per_well'] = " per well, averaged across replicates" if replicates > 1 else ""
+        hours = params.get('incubation_hours')
+        fields['incubation_days'] = int(hours) // 24 if hours not in (None, "") else NOT_RECORDED
+    elif assay == 'PRNT':
+        fold = params.get('fold')
+        fields['fold_text'] = f"{_number(float(fold))}-fold " if fold not in (None, "") else ""
+        if params.get('start_dilution') not in (None, ""):
+            fields['start_dilution'] = _number(float(params['start_dilution']))
+    return fields
+
+
+def pfu_methods(params):
+    # params: cell_line, plate_type, volume_ul, replicates, overlay, incubation_hours,
+    # dilution_exp (positive exponent), plaques, result
+    fields = _fields('PFU', params)
+    return render(_TEMPLATES['PFU'], fields) + render(_TEMPLATES['PFU_RESULT'], fields)
+
+
+def tcid50_methods(params):
+    # params: method, cell_line, volume_ul, wells_per_dilution, result
+    fields = _fields('TCID50', params)
+    return render(_TEMPLATES['TCID50'], fields) + render(_TEMPLATES['TCID50_RESULT'], fields)
+
+
+def prnt_methods(params):
+    # params: start_dilution, fold, cell_line, plate_type, overlay
+    return render(_TEMPLATES['PRNT'], _fields('PRNT', params))
+
+
+def assays_from_history(rows):
+    # History rows -> assay dicts understood by batch_methods (other calculation types are skipped)
+    assays = []
+    for row in rows:
+        calc_type = str(row.get('type', ''))
+        if calc_type == 'PFU':
+            assay = dict(row, assay='PFU')
+            match = re.search(r"10\^-?(\d+)", str(row.get('dilution', '')))
+            assay['dilution_exp'] = int(match.group(1)) if match else NOT_RECORDED
+        elif calc_type.startswith('TCID50'):
+            method = row.get('method') or (calc_type[len("TCID50 ("):-1] if calc_type.endswith(")") else None)
+            assay = dict(row, assay='TCID50', method=method)
+        elif calc_type == 'PRNT':
+            assay = dict(row, assay='PRNT')
+        else:
+            continue
+        assays.append(assay)
+    return assays
+
+
+def _countability(assays):
+    # Range fields of a PFU group, from each history row's countability
+    outside = sum(assay.get('countability') == 'Warning' for assay in assays)
+    return {
+        'counted_range': PFU_COUNTED_RANGE if all(a.get('countability') == 'Valid' for a in assays) else "",
+        'outside_range': render(_TEMPLATES['PFU_OUTSIDE'], {'outside': outside}) if outside else "",
+    }
+
+
+def _label(value):
+    return NOT_RECORDED if value is None or value == "" else str(value)
+
+
+def _cell(value):
+    return "-" if value is None or value == "" else str(value)
+
+
+def batch_methods(assays):
+    # Group assays by protocol; returns {'sections': [...]} with one section per assay type
+    grouped = {}
+    for assay in assays:
+        spec = ASSAYS[assay['assay']]
+        key = tuple(_label(assay.get(name)) for name in spec['protocol'])
+        grouped.setdefault(assay['assay'], {}).setdefault(key, []).append(assay)
+
+    sections = []
+    for table_number, (assay_type, groups) in enumerate(grouped.items(), start=1):
+        spec = ASSAYS[assay_type]
+        names = list(spec['protocol'])
+        table = f"Table {table_number}"
+
+        # Protocol parameters that are not the same across every group
+        varying = [i for i, name in enumerate(names) if len({key[i] for key in groups}) > 1]
+        differences = []
+        for i in varying:
+            counts = {}
+            for key, members in groups.items():
+                counts[key[i]] = counts.get(key[i], 0) + len(members)
+            values = ", ".join(f"{value} (n = {n})" for value, n in sorted(counts.items(), key=lambda c: -c[1]))
+            differences.append(f"{spec['protocol'][names[i]]}: {values}")
+
+        protocols = []
+        for number, (key, members) in enumerate(sorted(groups.items(), key=lambda g: -len(g[1])), start=1):
+            fields = _fields(assay_type, {name: value for name, value in zip(names, key) if value != NOT_RECORDED})
+            noun = ("serum", "sera") if assay_type == 'PRNT' else ("assay", "assays")
+            fields.update({'count': f"{len(members)} {noun[len(members) != 1]}", 'table': table})
+            if assay_type == 'PFU':
+                fields.update(_countability(members))
+            paragraph = render(_TEMPLATES[assay_type], fields) + render(_TEMPLATES[f"{assay_type}_BATCH"], fields)
+            label = "; ".join(f"{spec['protocol'][names[i]]} {key[i]}" for i in varying)
+            protocols.append({'number': number, 'label': label, 'count': len(members),
+                              'paragraph': paragraph, 'key': key})
+
+        protocol_of = {p['key']: p['number'] for p in protocols}
+        columns = (["Protocol"] if len(protocols) > 1 else []) + list(spec['columns'].values())
+        rows = []
+        for key, members in sorted(groups.items(), key=lambda g: protocol_of[g[0]]):
+            for assay in members:
+                row = [str(protocol_of[key])] if len(protocols) > 1 else []
+                row.extend(_cell(assay.get(field)) for field in spec['columns'])
+                rows.append(row)
+
+        sections.append({
+            'assay': assay_type,
+            'title': spec['title'],
+            'count': sum(len(members) for members in groups.values()),
+            'differences': differences,
+            'protocols': protocols,
+            'table': {'title': table, 'columns': columns, 'rows': rows},
+        })
+    return {'sections': sections}
+
+
+def _summary(section):
+    # Lead-in sentence when a section has more than one protocol
+    n = len(section['protocols'])
+    if n == 1:
+        return None
+    return (f"{section['count']} assays were run with {n} protocols that differed in "
+            f"{'; '.join(section['differences'])}. Each protocol is described below; "
+            f"the protocol of each assay is given in {section['table']['title']}.")
+
+
+def to_text(document):
+    lines = []
+    for section in document['sections']:
+        lines += [f"{section['title']} (n = {section['count']})", ""]
+        if _summary(section):
+            lines += [_summary(section), ""]
+        for protocol in section['protocols']:
+            if len(section['protocols']) > 1:
+                lines.append(f"Protocol {protocol['number']} ({protocol['label']}; n = {protocol['count']}):")
+            lines += [protocol['paragraph'], ""]
+        table = section['table']
+        lines.append(f"{table['title']}. {section['title']} results")
+        lines.append("\t".join(table['columns']))
+        lines.extend("\t".join(row) for row in table['rows'])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _md_cell(value):
+    return str(value).replace("|", "\\|")
+
+
+def to_markdown(document):
+    lines = []
+    for section in document['sections']:
+        lines += [f"## {section['title']} (n = {section['count']})", ""]
+        if _summary(section):
+            lines += [_summary(section), ""]
+        for protocol in section['protocols']:
+            if len(section['protocols']) > 1:
+                lines += [f"**Protocol {protocol['number']}** ({protocol['label']}; n = {protocol['count']})", ""]
+            lines += [protocol['paragraph'], ""]
+        table = section['table']
+        lines += [f"**{table['title']}.** {section['title']} results", ""]
+        lines.append("| " + " | ".join(_md_cell(c) for c in table['columns']) + " |")
+        lines.append("|" + "---|" * len(table['columns']))
+        lines.extend("| " + " | ".join(_md_cell(c) for c in row) + " |" for row in table['rows'])
+        lines.append("")
+    return "\n".join(lines)
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def _docx_paragraph(text, bold=False, size=None):
+    props = ("<w:b/>" if bold else "") + (f'<w:sz w:val="{size}"/>' if size else "")
+    run_props = f"<w:rPr>{props}</w:rPr>" if props else ""
+    return f'<w:p><w:r>{run_props}<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _docx_table(columns, rows):
+    def _row(cells, bold=False):
+        return "<w:tr>" + "".join(f"<w:tc>{_docx_paragraph(str(c), bold)}</w:tc>" for c in cells) + "</w:tr>"
+    borders = "".join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+                      for side in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    return (f'<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/><w:tblBorders>{borders}</w:tblBorders></w:tblPr>'
+            + _row(columns, bold=True) + "".join(_row(row) for row in rows) + "</w:tbl>")
+
+
+def to_docx(document):
+    # Minimal WordprocessingML package: headings, paragraphs and bordered tables
+    body = []
+    for section in document['sections']:
+        body.append(_docx_paragraph(f"{section['title']} (n = {section['count']})", bold=True, size=28))
+        if _summary(section):
+            body.append(_docx_paragraph(_summary(section)))
+        for protocol in section['protocols']:
+            if len(section['protocols']) > 1:
+                body.append(_docx_paragraph(
+                    f"Protocol {protocol['number']} ({protocol['label']}; n = {protocol['count']})", bold=True))
+            body.append(_docx_paragraph(protocol['paragraph']))
+        table = section['table']
+        body.append(_docx_paragraph(f"{table['title']}. {section['title']} results", bold=True))
+        body.append(_docx_table(table['columns'], table['rows']))
+        body.append(_docx_paragraph(""))
+
+    xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+           '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+           f'<w:body>{"".join(body)}<w:sectPr/></w:body></w:document>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", _DOCX_RELS)
+        docx.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    "Text": (to_text, "txt", "text/plain"),
+    "Markdown": (to_markdown, "md", "text/markdown"),
+    "Word (DOCX)": (to_docx, "docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+
+def export_history(rows, fmt="Text", progress=None):
+    # Consolidated methods for every PFU, TCID50 and PRNT entry in the history
+    document = batch_methods(assays_from_history(rows))
+    if progress is not None:
+        progress(0.5)
+    if not document['sections']:
+        raise ValueError("No PFU, TCID50 or PRNT calculations in the history")
+    return EXPORT_FORMATS[fmt][0](document)
@@ -0,0 +1,384 @@
+"""Plate-reader export importer for TCID50/CPE scoring.
+
+Reads absorbance or fluorescence exports (CSV or XLSX, any number of 96- or
+384-well plates per file), maps wells to dilutions with a layout template,
+scores every well of every plate in one vectorized pass and tallies positive
+and total wells per dilution for the TCID50 calculators.
+
+Files are read row by row: CSV through the csv module and XLSX through
+openpyxl's read-only mode, yielding one plate at a time, so a large
+multi-plate export never has to be held in memory as a whole workbook.
+"""
+import csv
+import io
+import itertools
+import re
+
+import numpy as np
+
+import calculators
+
+PLATE_SHAPES = {96: (8, 12), 384: (16, 24)}
+ROW_LETTERS = "ABCDEFGHIJKLMNOP"
+
+NEGATIVE_CONTROL_LABELS = {"NC", "CC", "NEG", "CELL"}
+POSITIVE_CONTROL_LABELS = {"PC", "VC", "POS", "VIRUS"}
+VALUE_COLUMNS = ("value", "od", "absorbance", "abs", "fluorescence", "rfu", "signal")
+
+WELL_PATTERN = re.compile(r"^([A-Pa-p])0*(\d{1,2})$")
+DECIMAL_COMMA = re.compile(r"^[+-]?\d*,\d+(?:[eE][+-]?\d+)?$")
+
+# Delimiters recognized in CSV exports; on a tie the comma loses, since a
+# semicolon row of decimal-comma values holds as many commas as semicolons
+CSV_DELIMITERS = (";", "\t", ",")
+
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except (TypeError, ValueError):
+        return None
+
+
+def _clean(row):
+    return ["" if cell is None else str(cell).strip() for cell in row]
+
+
+def _sniff_delimiter(lines):
+    # The candidate that dominates most lines; title lines such as "Plate 1"
+    # hold no candidate and do not vote
+    votes = {}
+    for line in lines:
+        counts = {d: line.count(d) for d in CSV_DELIMITERS}
+        best = max(counts, key=counts.get)
+        if counts[best]:
+            votes[best] = votes.get(best, 0) + 1
+    return max(votes, key=votes.get) if votes else ","
+
+
+def _csv_rows(stream):
+    if isinstance(stream, (str, bytes)) or hasattr(stream, "__fspath__"):
+        stream = open(stream, "rb")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    # Pick the delimiter from the first lines, then keep streaming
+    head = list(itertools.islice(text, 50))
+    delimiter = _sniff_delimiter(head)
+    for row in csv.reader(itertools.chain(head, text), delimiter=delimiter):
+        row = _clean(row)
+        if delimiter != ",":
+            # Semicolon/tab exports from European locales write 0,123
+            row = [c.replace(",", ".") if DECIMAL_COMMA.match(c) else c for c in row]
+        yield row
+
+
+def _xlsx_rows(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Reading XLSX exports requires openpyxl (pip install openpyxl)")
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            # A sheet title acts as a plate label for grids without one
+            yield [f"Plate {sheet.title}"]
+            for row in sheet.iter_rows(values_only=True):
+                yield _clean(row)
+            yield []
+    finally:
+        workbook.close()
+
+
+def iter_rows(source, filename=None):
+    # Rows of cells as strings, from a path or an uploaded file object
+    name = (filename or getattr(source, "name", None) or str(source)).lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        return _xlsx_rows(source)
+    return _csv_rows(source)
+
+
+def _is_column_header(cells):
+    numbers = [_to_float(c) for c in cells[1:] if c]
+    return len(numbers) in (12, 24) and numbers == list(range(1, len(numbers) + 1))
+
+
+def _grid_values(cells, n_cols):
+    values = [_to_float(c) for c in cells[1:1 + n_cols]]
+    return [np.nan if v is None else v for v in values]
+
+
+def iter_plates(source, filename=None):
+    # Yield (plate name, (rows, cols) float array) one plate at a time.
+    # Understands grid blocks (row letters down the side, optionally headed by
+    # column numbers 1..12/24) and long tables with a Well column.
+    plate_count = 0
+    label = None
+    grid, n_cols = [], None
+    long_format = None
+    long_plate, long_grid = None, None
+
+    def _next_name():
+        nonlocal plate_count, label
+        plate_count += 1
+        name = label or f"Plate {plate_count}"
+        label = None
+        return name
+
+    def _flush_grid():
+        nonlocal grid, n_cols
+        if not grid:
+            return None
+        shape = PLATE_SHAPES[96] if n_cols <= 12 and len(grid) <= 8 else PLATE_SHAPES[384]
+        values = np.full(shape, np.nan)
+        for r, row in enumerate(grid[:shape[0]]):
+            values[r, :len(row)] = row[:shape[1]]
+        grid, n_cols = [], None
+        return _next_name(), values
+
+    def _flush_long():
+        nonlocal long_grid
+        if long_grid is None:
+            return None
+        filled = np.argwhere(np.isfinite(long_grid))
+        fits_96 = filled.size == 0 or (filled[:, 0].max() < 8 and filled[:, 1].max() < 12)
+        values = long_grid[:8, :12] if fits_96 else long_grid
+        long_grid = None
+        if long_plate:
+            return long_plate, values
+        return _next_name(), values
+
+    for cells in iter_rows(source, filename):
+        non_empty = [c for c in cells if c]
+
+        # Long format: header row with a Well column, then one well per row
+        if long_format is None and any(c.lower() == "well" for c in cells):
+            lower = [c.lower() for c in cells]
+            well_col = lower.index("well")
+            plate_col = lower.index("plate") if "plate" in lower else None
+            value_col = next((lower.index(v) for v in VALUE_COLUMNS if v in lower), well_col + 1)
+            long_format = (well_col, plate_col, value_col)
+            continue
+
+        if long_format is not None:
+            well_col, plate_col, value_col = long_format
+            match = WELL_PATTERN.match(cells[well_col]) if len(cells) > well_col else None
+            if not match:
+                continue
+            plate = cells[plate_col] if plate_col is not None and len(cells) > plate_col else None
+            if long_grid is not None and plate != long_plate:
+                yield _flush_long()
+            if long_grid is None:
+                long_plate, long_grid = plate, np.full(PLATE_SHAPES[384], np.nan)
+            value = _to_float(cells[value_col]) if len(cells) > value_col else None
+            row, col = ROW_LETTERS.index(match.group(1).upper()), int(match.group(2)) - 1
+            if value is not None and col < 24:
+                long_grid[row, col] = value
+            continue
+
+        # Grid format
+        if _is_column_header(cells):
+            flushed = _flush_grid()
+            if flushed:
+                yield flushed
+            n_cols = len([c for c in cells[1:] if c])
+            continue
+
+        first = cells[0].upper() if cells else ""
+        expected_letter = ROW_LETTERS[len(grid)] if len(grid) < len(ROW_LETTERS) else None
+        numeric = any(_to_float(c) is not None for c in cells[1:])
+        # Row A straight after a block (no blank line or header) starts the next plate
+        if first == "A" and grid and first != expected_letter and numeric:
+            yield _flush_grid()
+            expected_letter = "A"
+        if first == expected_letter and numeric:
+            if n_cols is None:
+                n_cols = 24 if sum(_to_float(c) is not None for c in cells[1:]) > 12 else 12
+            grid.append(_grid_values(cells, n_cols))
+            continue
+
+        flushed = _flush_grid()
+        if flushed:
+            yield flushed
+        if non_empty and "plate" in non_empty[0].lower():
+            label = " ".join(non_empty)
+
+    flushed = _flush_grid() if long_format is None else _flush_long()
+    if flushed:
+        yield flushed
+
+
+def parse_layout(rows):
+    # Layout template: a plate-shaped grid of labels. Each cell is a dilution
+    # exponent ("-3" or "10^-3"), optionally prefixed by a sample ("S1:-3"),
+    # a control label (NC/CC negative, PC/VC positive) or blank for unused.
+    rows = [_clean(r) for r in rows]
+    rows = [r for r in rows if any(r)]
+    if rows and _is_column_header(rows[0]):
+        rows = rows[1:]
+    if rows and all(r[0].upper() == ROW_LETTERS[i] for i, r in enumerate(rows[:len(ROW_LETTERS)])):
+        rows = [r[1:] for r in rows]
+
+    n_cols = max(len(r) for r in rows)
+    shape = PLATE_SHAPES[96] if len(rows) <= 8 and n_cols <= 12 else PLATE_SHAPES[384]
+    dilution_exp = np.full(shape, np.nan)
+    sample = np.full(shape, "", dtype=object)
+    negative = np.zeros(shape, dtype=bool)
+    positive = np.zeros(shape, dtype=bool)
+
+    for r, row in enumerate(rows[:shape[0]]):
+        for c, cell in enumerate(row[:shape[1]]):
+            label = cell.upper()
+            if not cell:
+                continue
+            if label in NEGATIVE_CONTROL_LABELS:
+                negative[r, c] = True
+                continue
+            if label in POSITIVE_CONTROL_LABELS:
+                positive[r, c] = True
+                continue
+            name, _, exp = cell.rpartition(":")
+            value = _to_float(exp.replace("10^", "").strip())
+            if value is None:
+                raise ValueError(f"Unrecognized layout cell {ROW_LETTERS[r]}{c + 1}: {cell!r}")
+            dilution_exp[r, c] = -abs(value)
+            sample[r, c] = name.strip() or "Sample"
+
+    return {
+        'dilution_exp': dilution_exp,
+        'sample': sample,
+        'negative_control': negative,
+        'positive_control': positive,
+    }
+
+
+def default_layout(plate_size=96):
+    # One dilution per row (10^-1 down), the last two columns as cell controls
+    n_rows, n_cols = PLATE_SHAPES[plate_size]
+    rows = []
+    for r in range(n_rows):
+        rows.append([str(-(r + 1))] * (n_cols - 2) + ["NC", "NC"])
+    return parse_layout(rows)
+
+
+def control_cutoffs(plates, layout, method="control_sd", k=3.0, direction="below"):
+    # Per-plate cutoffs from control wells, vectorized over a (plates, rows, cols) stack.
+    # direction: "below" = CPE lowers the signal (e.g. crystal violet absorbance),
+    #            "above" = infection raises it (e.g. reporter fluorescence)
+    negative = layout['negative_control']
+    if not negative.any():
+        raise ValueError("Layout has no negative control (NC/CC) wells")
+    neg = np.where(negative, plates, np.nan).reshape(len(plates), -1)
+    neg_mean = np.nanmean(neg, axis=1)
+
+    if method == "control_midpoint":
+        if not layout['positive_control'].any():
+            raise ValueError("Layout has no positive control (PC/VC) wells")
+        pos = np.where(layout['positive_control'], plates, np.nan).reshape(len(plates), -1)
+        return (neg_mean + np.nanmean(pos, axis=1)) / 2
+
+    neg_sd = np.nanstd(neg, axis=1, ddof=1) if negative.sum() > 1 else np.zeros(len(plates))
+    sign = -1.0 if direction == "below" else 1.0
+    return neg_mean + sign * k * neg_sd
+
+
+def score_wells(plates, cutoffs, direction="below"):
+    # Boolean (plates, rows, cols) positive calls; NaN wells are never positive
+    cutoffs = np.broadcast_to(np.asarray(cutoffs, dtype=float), (len(plates),))[:, None, None]
+    if direction == "below":
+        return plates < cutoffs
+    return plates > cutoffs
+
+
+def tally(plates, scored, layout):
+    # Positive and total wells per (plate, sample, dilution).
+    # Returns sample names and (plates, samples, dilutions) arrays padded with NaN.
+    sample_wells = np.isfinite(layout['dilution_exp'])
+    keys = [(layout['sample'][rc], layout['dilution_exp'][rc]) for rc in zip(*np.nonzero(sample_wells))]
+    samples = sorted({s for s, _ in keys})
+    dilutions = {s: sorted({d for t, d in keys if t == s}, reverse=True) for s in samples}
+    max_dilutions = max(len(d) for d in dilutions.values())
+
+    # One-hot map from wells to (sample, dilution) slots
+    n_slots = len(samples) * max_dilutions
+    onehot = np.zeros((layout['dilution_exp'].size, n_slots))
+    exps = np.full((len(samples), max_dilutions), np.nan)
+    for i, s in enumerate(samples):
+        for j, d in enumerate(dilutions[s]):
+            exps[i, j] = d
+            wells = sample_wells & (layout['sample'] == s) & (layout['dilution_exp'] == d)
+            onehot[wells.ravel(), i * max_dilutions + j] = 1
+
+    measured = np.isfinite(plates).reshape(len(plates), -1).astype(float)
+    positive = (scored.reshape(len(plates), -1) & (measured > 0)).astype(float) @ onehot
+    total = measured @ onehot
+
+    shape = (len(plates), len(samples), max_dilutions)
+    positive = positive.reshape(shape)
+    total = total.reshape(shape)
+    padding = np.isnan(exps)[None].repeat(len(plates), axis=0)
+    positive[padding] = np.nan
+    total[padding] = np.nan
+    return samples, np.broadcast_to(exps, shape), positive, total
+
+
+def titrate(plates, layout, volume_ul, method="Reed-Muench", cutoff="threshold",
+            threshold=None, k=3.0, direction="below"):
+    # Score a (plates, rows, cols) stack and calculate TCID50/mL for every plate × sample
+    plates = np.asarray(plates, dtype=float)
+    if plates.shape[1:] != layout['dilution_exp'].shape:
+        raise ValueError(
+            f"Layout is {layout['dilution_exp'].size}-well but plates are {plates[0].size}-well"
+        )
+    if cutoff == "threshold":
+        cutoffs = np.full(len(plates), float(threshold))
+    else:
+        cutoffs = control_cutoffs(plates, layout, cutoff, k, direction)
+
+    scored = score_wells(plates, cutoffs, direction)
+    samples, exps, positive, total = tally(plates, scored, layout)
+
+    if method == "Reed-Muench":
+        log_dilution = calculators.reed_muench(exps, positive, total)['log_dilution']
+    else:
+        log_dilution = calculators.spearman_karber(exps, positive, total)['log_dilution']
+
+    return {
+        'samples': samples,
+        'cutoffs': cutoffs,
+        'scored': scored,
+        'dilution_exp': exps,
+        'positive': positive,
+        'total': total,
+        'log_dilution': log_dilution,
+        'tcid50_per_ml': calculators.tcid50_per_ml(log_dilution, volume_ul),
+    }
+
+
+def titrate_file(source, layout, volume_ul, filename=None, batch_size=64, progress=None, **options):
+    # Stream plates from an export and titrate them in batches of `batch_size`;
+    # per-plate arrays from every batch are concatenated along the plate axis.
+    # progress(None, message) is called after each batch (plate count is not known up front).
+    names, batches = [], []
+    for chunk in _batched(iter_plates(source, filename), batch_size):
+        names.extend(name for name, _ in chunk)
+        batches.append(titrate(np.stack([values for _, values in chunk]), layout, volume_ul, **options))
+        if progress is not None:
+            progress(None, f"{len(names)} plates scored")
+    if not batches:
+        raise ValueError("No plates found in file")
+
+    results = {'plates': names, 'samples': batches[0]['samples']}
+    for key in batches[0]:
+        if key != 'samples':
+            results[key] = np.concatenate([b[key] for b in batches])
+    return results
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
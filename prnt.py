@@ -0,0 +1,244 @@
+"""Plaque reduction neutralization test (PRNT) calculations.
+
+Plaque counts across serum dilutions are converted to percent neutralization
+against virus-only controls and fitted with a 4-parameter logistic. All
+samples are fitted together as one batched Levenberg-Marquardt problem, so a
+serosurvey of thousands of sera is a handful of numpy operations per iteration
+rather than thousands of separate fits.
+"""
+import numpy as np
+
+import calculators
+
+LN10 = np.log(10.0)
+
+# Bounds on the fitted asymptotes (% neutralization); a free top drifts far
+# past 100% on sera that never plateau within the series
+ASYMPTOTE_MIN = -20.0
+ASYMPTOTE_MAX = 120.0
+
+# QC thresholds for a fit to be reported without a flag
+MIN_POINTS = 4
+MIN_R_SQUARED = 0.90
+MAX_ITERATIONS = 200
+
+
+def percent_neutralization(plaques, control_plaques):
+    # plaques: (samples, dilutions) or (samples, dilutions, replicates)
+    # control_plaques: scalar, (samples,) or (samples, control wells)
+    plaques = np.asarray(plaques, dtype=float)
+    if plaques.ndim == 3:
+        plaques = np.nanmean(plaques, axis=2)
+    plaques = np.atleast_2d(plaques)
+
+    control = np.asarray(control_plaques, dtype=float)
+    if control.ndim == 2:
+        control = np.nanmean(control, axis=1)
+    control = np.broadcast_to(control, plaques.shape[:1]).astype(float)
+    control = np.where(control > 0, control, np.nan)
+
+    return 100.0 * (1.0 - plaques / control[:, None])
+
+
+def _logistic(params, x):
+    bottom, top, log_mid, hill = (params[:, i:i + 1] for i in range(4))
+    z = np.clip(hill * (x - log_mid), -30.0, 30.0)
+    e = 10.0 ** z
+    return bottom + (top - bottom) / (1.0 + e), e
+
+
+def _jacobian(params, x, e):
+    bottom, top, log_mid, hill = (params[:, i:i + 1] for i in range(4))
+    inv = 1.0 / (1.0 + e)
+    span = (top - bottom) * e * LN10 * inv ** 2
+    return np.stack([
+        1.0 - inv,
+        inv,
+        span * hill,
+        -span * (x - log_mid),
+    ], axis=2)
+
+
+def _initial_guess(x, y, mask):
+    y_obs = np.where(mask, y, np.nan)
+    bottom = np.clip(np.nanmin(y_obs, axis=1), ASYMPTOTE_MIN, 40.0)
+    top = np.clip(np.nanmax(y_obs, axis=1), 60.0, ASYMPTOTE_MAX)
+
+    # Midpoint: the dilution whose neutralization is closest to halfway
+    half = (bottom + top) / 2
+    distance = np.where(mask, np.abs(y - half[:, None]), np.inf)
+    log_mid = x[np.arange(x.shape[0]), distance.argmin(axis=1)]
+    hill = np.ones_like(bottom)
+    return np.stack([bottom, top, log_mid, hill], axis=1)
+
+
+def fit_logistic(log_dilutions, neutralization, max_iterations=MAX_ITERATIONS):
+    # Batched 4PL fit: y = bottom + (top - bottom) / (1 + 10^(hill * (x - log_mid)))
+    y = np.atleast_2d(np.asarray(neutralization, dtype=float))
+    x = np.broadcast_to(np.asarray(log_dilutions, dtype=float), y.shape).astype(float)
+    mask = np.isfinite(y) & np.isfinite(x)
+    weights = mask.astype(float)
+    y_filled = np.where(mask, y, 0.0)
+    x_filled = np.where(mask, x, 0.0)
+    n_points = mask.sum(axis=1)
+
+    params = _initial_guess(x_filled, y_filled, mask)
+    params = np.where(np.isfinite(params), params, 0.0)
+    damping = np.full(y.shape[0], 1e-2)
+    converged = np.zeros(y.shape[0], dtype=bool)
+
+    fitted, e = _logistic(params, x_filled)
+    sse = np.sum(weights * (y_filled - fitted) ** 2, axis=1)
+    eye = np.eye(4)
+
+    for _ in range(max_iterations):
+        active = ~converged
+        if not active.any():
+            break
+
+        jac = _jacobian(params, x_filled, e) * weights[:, :, None]
+        resid = (y_filled - fitted) * weights
+        # An asymptote held at its bound by a gradient pointing outside stays fixed
+        push = np.einsum('ndi,nd->ni', jac[:, :, :2], resid)
+        held = ((params[:, :2] <= ASYMPTOTE_MIN) & (push < 0)) | ((params[:, :2] >= ASYMPTOTE_MAX) & (push > 0))
+        jac[:, :, :2] *= ~held[:, None, :]
+        jtj = np.einsum('ndi,ndj->nij', jac, jac)
+        jtr = np.einsum('ndi,nd->ni', jac, resid)
+
+        diag = np.einsum('nii->ni', jtj)
+        lhs = jtj + (damping[:, None] * np.maximum(diag, 1e-9))[:, :, None] * eye + 1e-12 * eye
+        step = np.linalg.solve(lhs, jtr[:, :, None])[:, :, 0]
+        step[converged] = 0.0
+
+        trial = params + step
+        trial[:, :2] = np.clip(trial[:, :2], ASYMPTOTE_MIN, ASYMPTOTE_MAX)
+        trial_fitted, trial_e = _logistic(trial, x_filled)
+        trial_sse = np.sum(weights * (y_filled - trial_fitted) ** 2, axis=1)
+
+        improved = active & (trial_sse < sse)
+        params = np.where(improved[:, None], trial, params)
+        fitted = np.where(improved[:, None], trial_fitted, fitted)
+        e = np.where(improved[:, None], trial_e, e)
+
+        rel_change = np.abs(sse - trial_sse) / np.maximum(sse, 1e-12)
+        sse = np.where(improved, trial_sse, sse)
+        damping = np.where(improved, damping / 10.0, damping * 10.0)
+        damping = np.clip(damping, 1e-12, 1e12)
+        converged |= active & ((improved & (rel_change < 1e-8)) | (damping >= 1e12))
+
+    ss_tot = np.sum(weights * (y_filled - np.sum(weights * y_filled, axis=1, keepdims=True)
+                               / np.maximum(n_points, 1)[:, None]) ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = np.where(ss_tot > 0, 1.0 - sse / ss_tot, np.nan)
+
+    return {
+        'bottom': params[:, 0],
+        'top': params[:, 1],
+        'log_midpoint': params[:, 2],
+        'hill': params[:, 3],
+        'r_squared': r_squared,
+        'n_points': n_points,
+        'converged': converged,
+    }
+
+
+def log_titer_at(fit, percent):
+    # Invert the 4PL for the log10 reciprocal dilution giving `percent` neutralization
+    bottom, top, hill = fit['bottom'], fit['top'], fit['hill']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (top - bottom) / (percent - bottom) - 1.0
+        log_x = fit['log_midpoint'] + np.log10(ratio) / hill
+    defined = (bottom < percent) & (percent < top) & (hill > 0) & (ratio > 0)
+    return np.where(defined, log_x, np.nan)
+
+
+def prnt_titers(reciprocal_dilutions, plaques, control_plaques, endpoints=(50, 90)):
+    # reciprocal_dilutions: (dilutions,) shared series, or (samples, dilutions)
+    # Returns a dict of per-sample arrays: titers, fit parameters and QC flags.
+    # prnt<N> is NaN outside the dilution series; prnt<N>_display then reads
+    # "<1:lowest" or ">1:highest" instead of a number.
+    neutralization = percent_neutralization(plaques, control_plaques)
+    dilutions = np.broadcast_to(np.asarray(reciprocal_dilutions, dtype=float),
+                                neutralization.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_dilutions = np.where(dilutions > 0, np.log10(dilutions), np.nan)
+
+    fit = fit_logistic(log_dilutions, neutralization)
+    lowest = np.nanmin(log_dilutions, axis=1)
+    highest = np.nanmax(log_dilutions, axis=1)
+
+    results = {'neutralization': neutralization}
+    results.update(fit)
+    flags = [[] for _ in range(neutralization.shape[0])]
+
+    for idx in np.flatnonzero(~np.isfinite(neutralization).any(axis=1)):
+        flags[idx].append('invalid control')
+    for idx in np.flatnonzero(fit['n_points'] < MIN_POINTS):
+        flags[idx].append(f"fewer than {MIN_POINTS} dilutions")
+    for idx in np.flatnonzero(~fit['converged']):
+        flags[idx].append('fit did not converge')
+    # A flat curve (ss_tot == 0) has no R²; its censoring flags below say why
+    for idx in np.flatnonzero(fit['r_squared'] < MIN_R_SQUARED):
+        flags[idx].append(f"R² below {MIN_R_SQUARED}")
+    # QC passes on fit quality alone; the censoring notes below still go into qc_flag
+    qc_pass = np.array([not f for f in flags])
+
+    # Observed neutralization at the ends of each series, for titers outside it
+    observed = np.isfinite(neutralization) & np.isfinite(log_dilutions)
+    rows = np.arange(neutralization.shape[0])
+    at_lowest = neutralization[rows, np.where(observed, log_dilutions, np.inf).argmin(axis=1)]
+    at_highest = neutralization[rows, np.where(observed, log_dilutions, -np.inf).argmax(axis=1)]
+    observed = observed.any(axis=1)
+
+    for percent in endpoints:
+        log_titer = log_titer_at(fit, percent)
+        # Still neutralizing at the highest dilution, or not yet at the lowest
+        over = observed & (at_lowest >= percent) & (at_highest >= percent)
+        under = observed & (at_lowest < percent) & (at_highest < percent)
+        below = under | (~over & (log_titer < lowest))
+        above = over | (~under & (log_titer > highest))
+        undefined = ~(below | above) & ~np.isfinite(log_titer)
+        for idx in np.flatnonzero(below):
+            flags[idx].append(f"PRNT{percent} below lowest dilution")
+        for idx in np.flatnonzero(above):
+            flags[idx].append(f"PRNT{percent} above highest dilution")
+        for idx in np.flatnonzero(undefined):
+            flags[idx].append(f"PRNT{percent} not reached")
+        in_range = ~(below | above | undefined)
+        titer = np.where(in_range, 10.0 ** log_titer, np.nan)
+        results[f"prnt{percent}"] = titer
+        results[f"prnt{percent}_display"] = np.array([
+            f"<1:{10.0 ** lowest[i]:.0f}" if below[i]
+            else f">1:{10.0 ** highest[i]:.0f}" if above[i]
+            else f"1:{titer[i]:.0f}" if in_range[i]
+            else "N/A"
+            for i in rows
+        ], dtype=object)
+
+    results['qc_flag'] = np.array(['; '.join(f) if f else 'OK' for f in flags], dtype=object)
+    results['qc_pass'] = qc_pass
+    return results
+
+
+def counts_from_long(samples, dilutions, plaques):
+    # Pivot long-format rows (sample, reciprocal dilution, plaques) into the
+    # (samples, dilutions, replicates) layout expected by prnt_titers.
+    # Rows with dilution 0 are that sample's virus-only control wells.
+    samples = np.asarray(samples).astype(str)
+    dilutions = np.asarray(dilutions, dtype=float)
+    plaques = np.asarray(plaques, dtype=float)
+
+    sample_ids, sample_idx = np.unique(samples, return_inverse=True)
+    is_control = dilutions == 0
+    series, dilution_idx = np.unique(dilutions[~is_control], return_inverse=True)
+
+    test_keys = sample_idx[~is_control] * max(len(series), 1) + dilution_idx
+    test_rep = calculators.rank_within(test_keys)
+    counts = np.full((len(sample_ids), len(series), test_rep.max() + 1 if len(test_rep) else 1), np.nan)
+    counts[sample_idx[~is_control], dilution_idx, test_rep] = plaques[~is_control]
+
+    control_rep = calculators.rank_within(sample_idx[is_control])
+    controls = np.full((len(sample_ids), control_rep.max() + 1 if len(control_rep) else 1), np.nan)
+    controls[sample_idx[is_control], control_rep] = plaques[is_control]
+
+    return sample_ids, series, counts, controls
@@ -0,0 +1,129 @@
+"""PDF reports for the calculator tabs.
+
+reportlab is only imported when this module is, and the app only imports it
+once a report is actually built, so sessions that never produce a report do
+not pay for loading it.
+"""
+import io
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+
+def _title_style(styles):
+    return ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#006400'),
+        spaceAfter=30,
+    )
+
+
+def _build(doc, story, progress):
+    # reportlab reports the flowable count, then each flowable as it is laid out
+    if progress is not None:
+        total = [len(story)]
+
+        def on_progress(kind, value):
+            if kind == 'SIZE_EST':
+                total[0] = max(value, 1)
+            elif kind == 'PROGRESS':
+                progress(value / total[0])
+
+        doc.setProgressCallBack(on_progress)
+    doc.build(story)
+
+
+def pfu_report(titer_display, parameters, methods_text, progress=None):
+    # parameters: [name, value] rows for the input data table
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    # Title
+    story.append(Paragraph("PFU Titer Calculation Report", _title_style(styles)))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Results
+    story.append(Paragraph(f"<b>Viral Titer:</b> {titer_display}", styles['Normal']))
+    story.append(Spacer(1, 0.1*inch))
+    
+    # Input data table
+    data = [['Parameter', 'Value']] + [list(row) for row in parameters]
+    
+    table = Table(data, colWidths=[2.5*inch, 3*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    story.append(table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Methods section
+    story.append(Paragraph("<b>Methods:</b>", styles['Heading2']))
+    story.append(Paragraph(methods_text, styles['Normal']))
+    
+    # Footer
+    story.append(Spacer(1, 0.5*inch))
+    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Italic']))
+    
+    _build(doc, story, progress)
+    return pdf_buffer.getvalue()
+
+
+def tcid50_report(calculation_method, tcid50_display, pfu_display, dilution_data, methods_text, progress=None):
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    story.append(Paragraph(f"TCID50 Calculation Report ({calculation_method})", _title_style(styles)))
+    story.append(Spacer(1, 0.2*inch))
+    
+    story.append(Paragraph(f"<b>TCID50 Titer:</b> {tcid50_display}", styles['Normal']))
+    story.append(Paragraph(f"<b>PFU Equivalent:</b> {pfu_display}", styles['Normal']))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Dilution data table
+    table_data = [['Dilution', 'Positive', 'Total', '% Positive']]
+    for d in dilution_data:
+        table_data.append([
+            f"10^{d['dilution_exp']}",
+            str(d['positive']),
+            str(d['total']),
+            f"{d['percent']:.1f}%"
+        ])
+    
+    table = Table(table_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige)
+    ]))
+    
+    story.append(table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    story.append(Paragraph("<b>Methods:</b>", styles['Heading2']))
+    story.append(Paragraph(methods_text, styles['Normal']))
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Italic']))
+    
+    _build(doc, story, progress)
+    return pdf_buffer.getvalue()
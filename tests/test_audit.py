@@ -0,0 +1,60 @@
+import pytest
+
+import audit
+
+
+def _log(tmp_path, n=3):
+    path = str(tmp_path / "audit.jsonl")
+    for i in range(n):
+        audit.record('PFU', {'plaques': i}, {'pfu_per_ml': i * 1e6}, path=path)
+    return path
+
+
+def test_chain_verifies(tmp_path):
+    path = _log(tmp_path)
+    result = audit.verify(path)
+    assert result['ok'] and result['entries'] == 3
+
+
+def test_edited_record_fails(tmp_path):
+    path = _log(tmp_path)
+    data = open(path, "rb").read().replace(b'"plaques": 1', b'"plaques": 7')
+    open(path, "wb").write(data)
+    result = audit.verify(path)
+    assert not result['ok'] and result['line'] == 2
+
+
+def test_torn_final_line_is_dropped_and_chain_continues(tmp_path):
+    path = _log(tmp_path)
+    with open(path, "ab") as f:
+        f.write(b'{"calculation": "PFU", "inp')
+    audit._tails.clear()
+    assert audit.record('PFU', {}, {}, path=path)[0] == 4
+    assert audit.verify(path)['ok']
+
+
+def test_malformed_complete_line_raises_audit_error(tmp_path):
+    path = _log(tmp_path)
+    with open(path, "ab") as f:
+        f.write(b'not a record\n')
+    audit._tails.clear()
+    with pytest.raises(audit.AuditError):
+        audit.record('PFU', {}, {}, path=path)
+
+
+def test_records_cut_off_the_end_fail_against_expected_head(tmp_path):
+    path = _log(tmp_path, n=5)
+    head = audit.verify(path)
+    lines = open(path, "rb").readlines()
+    open(path, "wb").writelines(lines[:3])
+    assert audit.verify(path)['ok']
+    result = audit.verify(path, expect_seq=head['entries'], expect_hash=head['last_hash'])
+    assert not result['ok'] and result['entries'] == 3
+
+
+def test_expected_head_allows_later_records(tmp_path):
+    path = _log(tmp_path)
+    head = audit.verify(path)
+    audit.record('PFU', {}, {}, path=path)
+    assert audit.verify(path, expect_seq=head['entries'], expect_hash=head['last_hash'])['ok']
+    assert not audit.verify(path, expect_seq=head['entries'], expect_hash="0" * 64)['ok']
@@ -0,0 +1,62 @@
+import math
+
+import numpy as np
+
+import calculators
+
+# 100/100/75/25/0/0 % positive wells across 10^-1 .. 10^-6: endpoint 10^-3.5
+EXPS = [-1, -2, -3, -4, -5, -6]
+POSITIVE = [8, 8, 6, 2, 0, 0]
+TOTAL = [8] * 6
+
+
+def test_reed_muench_known_series():
+    result = calculators.reed_muench(EXPS, POSITIVE, TOTAL)
+    assert math.isclose(float(result['log_dilution']), -3.5)
+    assert math.isclose(float(result['proportionate_distance']), 0.5)
+    assert math.isclose(float(result['percent_above']), 80.0)
+    assert float(result['exp_above']) == -3 and float(result['exp_below']) == -4
+
+
+def test_reed_muench_uses_cumulative_totals():
+    # 8/6/5/1/0 of 8 wells: cumulative 100/85.7/54.5/7.7/0 % infected -> 10^-3.10
+    # (raw per-dilution percentages would give 10^-3.25)
+    result = calculators.reed_muench([-1, -2, -3, -4, -5], [8, 6, 5, 1, 0], [8] * 5)
+    assert math.isclose(float(result['percent_above']), 600 / 11)
+    assert math.isclose(float(result['percent_below']), 100 / 13)
+    assert round(float(result['log_dilution']), 2) == -3.10
+
+
+def test_reed_muench_ignores_input_order():
+    order = [3, 0, 5, 1, 4, 2]
+    result = calculators.reed_muench(np.take(EXPS, order), np.take(POSITIVE, order), np.take(TOTAL, order))
+    assert math.isclose(float(result['log_dilution']), -3.5)
+
+
+def test_reed_muench_without_transition_is_nan():
+    assert math.isnan(float(calculators.reed_muench(EXPS, TOTAL, TOTAL)['log_dilution']))
+
+
+def test_spearman_karber_known_series():
+    result = calculators.spearman_karber(EXPS, POSITIVE, TOTAL)
+    assert math.isclose(float(result['log_dilution']), -3.5)
+    assert math.isclose(float(result['sum_proportions']), 3.0)
+
+
+def test_stacked_series_match_single():
+    stacked = calculators.reed_muench([EXPS, EXPS], [POSITIVE, [8, 8, 8, 4, 0, 0]], [TOTAL, TOTAL])
+    np.testing.assert_allclose(stacked['log_dilution'], [-3.5, -4.0])
+
+
+def test_tcid50_per_ml():
+    assert math.isclose(float(calculators.tcid50_per_ml(-3.5, 100)), 10 ** 3.5 * 10)
+
+
+def test_pfu_per_ml_and_countable():
+    assert float(calculators.pfu_per_ml(50, 1e6, 100)) == 5e8
+    assert list(calculators.is_countable([29, 30, 300, 301])) == [False, True, True, False]
+
+
+def test_rank_within():
+    assert list(calculators.rank_within([4, 7, 4, 4, 7, 1])) == [0, 0, 1, 2, 1, 0]
+    assert list(calculators.rank_within([])) == []
@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+import pytest
+
+import growth_kinetics
+
+TIMES = [0, 12, 24, 36, 48, 60]
+
+
+def test_fit_growth_exponential_phase():
+    # Flat for 12 h, then +1 log10 per 12 h until a 4-log plateau
+    log_titers = [[2.0, 2.0, 3.0, 4.0, 5.0, 5.0]]
+    fit = growth_kinetics.fit_growth(TIMES, log_titers)
+    assert math.isclose(float(fit['growth_rate'][0]), 1 / 12)
+    assert math.isclose(float(fit['doubling_time'][0]), math.log10(2) * 12)
+    assert math.isclose(float(fit['lag'][0]), 12.0)
+    assert float(fit['peak_log_titer'][0]) == 5.0
+    assert float(fit['time_to_peak'][0]) == 48.0
+
+
+def test_fit_growth_single_timepoint():
+    fit = growth_kinetics.fit_growth([24], [[3.0], [4.5]])
+    assert np.isnan(fit['growth_rate']).all()
+    assert np.isnan(fit['lag']).all()
+    assert np.isnan(fit['doubling_time']).all()
+    assert list(fit['peak_log_titer']) == [3.0, 4.5]
+    assert list(fit['auc']) == [0.0, 0.0]
+
+
+def test_fit_growth_declining_series_has_no_rate():
+    fit = growth_kinetics.fit_growth(TIMES, [[5.0, 4.5, 4.0, 3.5, 3.0, 2.5]])
+    assert np.isnan(fit['growth_rate'][0]) and np.isnan(fit['lag'][0])
+
+
+def test_pivot_series_averages_replicate_measurements_in_log_space():
+    series = growth_kinetics.pivot_series(
+        ['wt', 'wt', 'wt'], ['1', '1', '1'], [0, 0, 24], [100.0, 10000.0, 1e6])
+    assert list(series['times']) == [0.0, 24.0]
+    assert np.allclose(series['log_titers'], [[3.0, 6.0]])
+
+
+def test_compare_conditions_unknown_reference():
+    fit = growth_kinetics.fit_growth(TIMES, [[2.0, 2.0, 3.0, 4.0, 5.0, 5.0]])
+    summary = growth_kinetics.summarize_conditions(['wt'], fit)
+    with pytest.raises(ValueError):
+        growth_kinetics.compare_conditions(summary, 'mutant')
@@ -0,0 +1,85 @@
+import history_index
+
+
+def _row(i, calc_type="PFU", cell_line="Vero", sample=None, titer_exp=6, day=1):
+    row = {
+        'timestamp': f"2024-03-{day:02d} 10:00:{i % 60:02d}",
+        'type': calc_type,
+        'cell_line': cell_line,
+        'result': f"5.00 × 10^{titer_exp} PFU/mL",
+    }
+    if sample:
+        row['sample'] = sample
+    return row
+
+
+ROWS = [
+    _row(0, "PFU", "Vero", "wild-type stock", 6, day=1),
+    _row(1, "TCID50 (Reed-Muench)", "Vero", "mutant A", 7, day=2),
+    _row(2, "TCID50 (Spearman-Karber)", "MDCK", "mutant A", 8, day=3),
+    _row(3, "PFU", "MDCK", "wild-type passage 2", 5, day=4),
+]
+
+
+def _index(rows=ROWS):
+    return history_index.update_index(history_index.new_index(), rows)
+
+
+def test_facets_or_within_and_across():
+    index = _index()
+    # OR within a facet
+    assert history_index.search(index, {'cell_line': ['Vero', 'MDCK']})['total'] == 4
+    assert history_index.search(index, {'method': ['Reed-Muench', 'Spearman-Karber']})['ids'] == [2, 1]
+    # AND across facets
+    assert history_index.search(index, {'type': ['TCID50'], 'cell_line': ['MDCK']})['ids'] == [2]
+    assert history_index.search(index, {'type': ['PFU'], 'method': ['Reed-Muench']})['total'] == 0
+    assert dict(history_index.facet_values(index, 'type')) == {'PFU': 2, 'TCID50': 2}
+
+
+def test_text_search_requires_every_word():
+    index = _index()
+    assert history_index.search(index, text="wild-type")['ids'] == [3, 0]
+    assert history_index.search(index, text="Mutant mdck")['ids'] == [2]
+    assert history_index.search(index, text="mutant absent")['total'] == 0
+
+
+def test_titer_and_date_ranges_are_inclusive():
+    index = _index()
+    assert history_index.search(index, titer_range=(5e6, 5e7))['ids'] == [1, 0]
+    assert history_index.search(index, date_range=("2024-03-02", "2024-03-03"))['ids'] == [2, 1]
+    # Rows without a parseable titer never match a titer range
+    index = _index(ROWS + [dict(_row(4), result="No 50% endpoint")])
+    assert history_index.search(index, titer_range=(0, 1e12))['total'] == 4
+
+
+def test_pages_are_clamped():
+    rows = [_row(i) for i in range(60)]
+    index = _index(rows)
+    first = history_index.search(index, page=-3, page_size=25)
+    assert (first['pages'], first['page'], first['ids'][0]) == (3, 0, 59)
+    last = history_index.search(index, page=99, page_size=25)
+    assert last['page'] == 2 and last['ids'] == list(range(9, -1, -1))
+    empty = history_index.search(index, text="nothing", page=5)
+    assert (empty['total'], empty['pages'], empty['page'], empty['ids']) == (0, 1, 0, [])
+
+
+def test_incremental_update_matches_full_build():
+    index = _index(ROWS[:2])
+    history_index.search(index, {'cell_line': ['MDCK']})  # caches a posting array
+    history_index.update_index(index, ROWS)
+    assert history_index.search(index, {'cell_line': ['MDCK']})['ids'] == [3, 2]
+    assert history_index.search(index, text="mutant")['ids'] == [2, 1]
+
+
+def test_cleared_and_refilled_history_is_rebuilt():
+    index = _index()
+    # Cleared, then as many or more new rows than before
+    for refill in (4, 6):
+        rows = [_row(i, "Plaque Morphology", "BHK") for i in range(refill)]
+        history_index.update_index(index, rows)
+        assert history_index.search(index, {'type': ['Plaque Morphology']})['total'] == refill
+        assert history_index.search(index, {'type': ['PFU']})['total'] == 0
+        assert history_index.search(index, text="mutant")['total'] == 0
+    # Cleared to fewer rows
+    history_index.update_index(index, ROWS[:1])
+    assert history_index.search(index)['ids'] == [0]
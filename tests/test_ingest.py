@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+import ingest
+from history import read_history
+
+
+def _drop(folder, name, text):
+    # Write a file and backdate it past the settle time
+    path = os.path.join(folder, name)
+    with open(path, "w") as f:
+        f.write(text)
+    old = time.time() - 60
+    os.utime(path, (old, old))
+    return path
+
+
+def _run(tmp_path, folder, messages):
+    ingest.run(str(folder), history_path=str(tmp_path / "history.jsonl"),
+               checkpoint_path=str(tmp_path / "checkpoint.json"), workers=2, poll_interval=0.01,
+               once=True, log=messages.append, audit_path=str(tmp_path / "audit.jsonl"))
+    return read_history(str(tmp_path / "history.jsonl"))[0]
+
+
+def test_restart_and_lost_checkpoint_never_reprocess(tmp_path):
+    folder = tmp_path / "share"
+    folder.mkdir()
+    _drop(folder, "plate_a.csv", "sample,dilution_exp,plaques\nS1,-6,50\nS2,-5,120\n")
+    _drop(folder, "plate_b.csv", "sample,dilution,plaques\nS3,1000,40\n")
+
+    messages = []
+    rows = _run(tmp_path, folder, messages)
+    assert len(rows) == 3
+    assert sorted(row['dilution'] for row in rows) == ["10^-3", "10^-5", "10^-6"]
+
+    # Restart: the checkpoint's mtime/size fast path skips both files
+    messages.clear()
+    assert len(_run(tmp_path, folder, messages)) == 3
+    assert not any(m.startswith("Ingested") for m in messages)
+
+    # Lost checkpoint: the hashes already in the history still skip both files
+    os.remove(tmp_path / "checkpoint.json")
+    messages.clear()
+    assert len(_run(tmp_path, folder, messages)) == 3
+    assert not any(m.startswith("Ingested") for m in messages)
+    with open(tmp_path / "checkpoint.json") as f:
+        files = json.load(f)['files']
+    assert {entry['status'] for entry in files.values()} == {'done'}
+
+
+def test_non_decimal_dilutions_fail_without_retry(tmp_path):
+    folder = tmp_path / "share"
+    folder.mkdir()
+    # PRNT upload format (reciprocal serum dilutions) and a zero dilution
+    _drop(folder, "prnt.csv", "sample,dilution,plaques\nS1,20,45\nS1,40,60\n")
+    _drop(folder, "zero.csv", "sample,dilution,plaques\nS1,0,45\n")
+
+    messages = []
+    assert _run(tmp_path, folder, messages) == []
+    with open(tmp_path / "checkpoint.json") as f:
+        files = json.load(f)['files']
+    assert {entry['status'] for entry in files.values()} == {'failed'}
+    assert all("power of 10" in entry['error'] for entry in files.values())
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+def _wait(job_id, timeout=5.0):
+    # Poll until the job leaves the queued/running states
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = jobs.status(job_id)
+        if snapshot is None or snapshot['state'] not in jobs.ACTIVE_STATES:
+            return snapshot
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} still active after {timeout}s")
+
+
+def _blocking(started, release, progress):
+    started.set()
+    progress(0.25, "first quarter")
+    while not release.wait(0.01):
+        progress(None)
+    progress(0.75)
+    return "done"
+
+
+def test_submit_and_result():
+    job_id = jobs.submit("sum", sum, [1, 2, 3], session="a")
+    assert _wait(job_id)['state'] == 'done'
+    assert jobs.result(job_id) == 6
+    assert jobs.status(job_id)['progress'] == 1.0
+
+
+def test_failed_job_reports_error():
+    job_id = jobs.submit("divide", lambda: 1 / 0, session="a")
+    snapshot = _wait(job_id)
+    assert snapshot['state'] == 'failed' and snapshot['error'].startswith("ZeroDivisionError")
+    with pytest.raises(RuntimeError):
+        jobs.result(job_id)
+
+
+def test_progress_is_visible_while_running():
+    started, release = threading.Event(), threading.Event()
+    job_id = jobs.submit("slow", _blocking, started, release, jobs.report_progress, session="a")
+    try:
+        assert started.wait(5)
+        snapshot = jobs.status(job_id)
+        assert snapshot['state'] == 'running'
+        assert snapshot['progress'] == 0.25 and snapshot['message'] == "first quarter"
+    finally:
+        release.set()
+    assert _wait(job_id)['state'] == 'done'
+    # report_progress outside a job is a no-op
+    jobs.report_progress(0.5)
+
+
+def test_cancel_running_and_queued_jobs():
+    started, release = threading.Event(), threading.Event()
+    # Occupy every batch worker so the last job stays queued
+    running = [jobs.submit("slow", _blocking, started, release, jobs.report_progress, session="a")
+               for _ in range(jobs.JOB_WORKERS)]
+    queued = jobs.submit("queued", sum, [1], session="a")
+    try:
+        assert started.wait(5)
+        assert jobs.cancel(queued)
+        assert jobs.status(queued)['state'] == 'cancelled'
+        assert jobs.cancel(running[0])
+    finally:
+        release.set()
+    assert _wait(running[0])['state'] == 'cancelled'
+    assert not jobs.cancel(running[0])
+    for job_id in running[1:]:
+        _wait(job_id)
+
+
+def test_active_jobs_capped_per_session():
+    release = threading.Event()
+    held = [jobs.submit("hold", release.wait, session="busy") for _ in range(jobs.MAX_ACTIVE)]
+    try:
+        with pytest.raises(RuntimeError):
+            jobs.submit("one more", sum, [1], session="busy")
+        # Another session is not held back by this one
+        other = jobs.submit("other", sum, [1], session="quiet")
+    finally:
+        release.set()
+    for job_id in held + [other]:
+        assert _wait(job_id)['state'] == 'done'
+
+
+def test_finished_jobs_capped_per_session(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_FINISHED", 3)
+    mine = jobs.submit("download", sum, [1], session="mine")
+    _wait(mine)
+    # A busy session finishing many jobs does not evict this session's result
+    theirs = [jobs.submit("export", sum, [i], session="theirs") for i in range(8)]
+    for job_id in theirs:
+        _wait(job_id)
+    assert jobs.result(mine) == 1
+    kept = [job_id for job_id in theirs if jobs.status(job_id) is not None]
+    assert kept == theirs[-3:]
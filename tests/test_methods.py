@@ -0,0 +1,26 @@
+import methods
+
+PFU_ROW = {'type': 'PFU', 'cell_line': 'Vero', 'plate_type': '6-well plate', 'volume_ul': 100, 'replicates': 1,
+           'overlay': 'Agar overlay', 'incubation_hours': 72, 'plaques': 50, 'dilution': '10^-6',
+           'result': '5.00 × 10^8 PFU/mL'}
+
+
+def _paragraph(countabilities):
+    rows = [dict(PFU_ROW, countability=c) for c in countabilities]
+    return methods.batch_methods(methods.assays_from_history(rows))['sections'][0]['protocols'][0]['paragraph']
+
+
+def test_countable_range_claimed_only_when_every_plate_was_countable():
+    assert "on plates with 30-300 plaques" in _paragraph(['Valid', 'Valid'])
+    assert "outside the countable range" not in _paragraph(['Valid', 'Valid'])
+
+
+def test_plates_outside_range_are_counted():
+    paragraph = _paragraph(['Valid', 'Warning', 'Warning'])
+    assert "on plates with 30-300 plaques" not in paragraph
+    assert "Counts for 2 of these fell outside the countable range" in paragraph
+
+
+def test_unrecorded_countability_makes_no_range_claim():
+    paragraph = _paragraph(['Valid', None])
+    assert "30-300" not in paragraph
@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+import pytest
+
+import plate_reader
+
+
+def _export(delimiter, decimal="."):
+    # One titled 96-well grid: wells read 0.9 (no CPE) in the top rows and the
+    # cell-control columns, 0.1 (CPE) elsewhere
+    lines = ["Plate 1", delimiter.join([""] + [str(c) for c in range(1, 13)])]
+    for r, letter in enumerate("ABCDEFGH"):
+        values = ["0.1" if r < 3 and c < 10 else "0.9" for c in range(12)]
+        lines.append(delimiter.join([letter] + [v.replace(".", decimal) for v in values]))
+    return io.BytesIO("\n".join(lines).encode())
+
+
+@pytest.mark.parametrize("delimiter, decimal", [(",", "."), (";", "."), ("\t", "."), (";", ","), ("\t", ",")])
+def test_titled_grid_in_any_delimiter(delimiter, decimal):
+    plates = list(plate_reader.iter_plates(_export(delimiter, decimal), filename="export.csv"))
+    assert [name for name, _ in plates] == ["Plate 1"]
+    values = plates[0][1]
+    assert values.shape == (8, 12)
+    assert np.isclose(values[0, 0], 0.1) and np.isclose(values[7, 11], 0.9)
+    assert np.isfinite(values).all()
+
+
+def test_titrate_semicolon_decimal_comma_export():
+    results = plate_reader.titrate_file(_export(";", ","), plate_reader.default_layout(), 100,
+                                        filename="export.csv", cutoff="threshold", threshold=0.5)
+    assert results['plates'] == ["Plate 1"]
+    assert np.isclose(results['log_dilution'][0], -3.5)
+
+
+def test_quoted_thousands_in_comma_export_are_not_decimals():
+    rows = list(plate_reader.iter_rows(io.BytesIO(b'Well,Value\nA1,"1,234"\n'), filename="export.csv"))
+    assert rows[1] == ["A1", "1,234"]
+
+
+@pytest.mark.parametrize("letters, n_cols", [("ABCDEFGH", 12), ("ABCDEFGHIJKLMNOP", 24)])
+def test_contiguous_grid_blocks_are_separate_plates(letters, n_cols):
+    # Three plates back to back with no header, title or blank line between them
+    lines = []
+    for plate in range(3):
+        for letter in letters:
+            lines.append(",".join([letter] + [str(plate + 1)] * n_cols))
+    plates = list(plate_reader.iter_plates(io.BytesIO("\n".join(lines).encode()), filename="export.csv"))
+    assert [name for name, _ in plates] == ["Plate 1", "Plate 2", "Plate 3"]
+    for plate, (_, values) in enumerate(plates):
+        assert values.shape == (len(letters), n_cols)
+        assert (values == plate + 1).all()
@@ -0,0 +1,40 @@
+import math
+
+import prnt
+
+DILUTIONS = [20, 40, 80, 160, 320, 640]
+
+
+def test_titer_inside_series():
+    result = prnt.prnt_titers(DILUTIONS, [[5, 10, 30, 60, 85, 95]], 100)
+    assert 80 < result['prnt50'][0] < 320
+    assert result['prnt50_display'][0] == f"1:{result['prnt50'][0]:.0f}"
+    assert result['qc_flag'][0] == 'OK'
+
+
+def test_full_and_no_neutralization_are_censored_differently():
+    result = prnt.prnt_titers(DILUTIONS, [[0] * 6, [100] * 6], 100)
+    assert list(result['prnt50_display']) == [">1:640", "<1:20"]
+    assert list(result['prnt90_display']) == [">1:640", "<1:20"]
+    assert all(math.isnan(t) for t in result['prnt50'])
+    assert "PRNT50 above highest dilution" in result['qc_flag'][0]
+    assert "PRNT50 below lowest dilution" in result['qc_flag'][1]
+    # Flat curves have no R² to flag
+    assert not any("R²" in flag for flag in result['qc_flag'])
+
+
+def test_censored_endpoint_still_passes_qc():
+    # PRNT50 inside the series, PRNT90 below its lowest dilution
+    result = prnt.prnt_titers(DILUTIONS, [[15, 30, 50, 70, 85, 95]], 100)
+    assert result['prnt90_display'][0] == "<1:20"
+    assert "PRNT90 below lowest dilution" in result['qc_flag'][0]
+    assert result['qc_pass'][0]
+
+
+def test_asymptotes_stay_bounded():
+    # Still climbing at the lowest dilution: an unbounded top ran past 2000%
+    # and the fit did not converge
+    result = prnt.prnt_titers([20 * 2 ** i for i in range(8)], [[18, 39, 55, 71, 84, 94, 92, 110]], 98)
+    assert prnt.ASYMPTOTE_MIN <= result['bottom'][0] <= result['top'][0] <= prnt.ASYMPTOTE_MAX
+    assert result['converged'][0]
+    assert 20 < result['prnt50'][0] < 80
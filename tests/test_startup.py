@@ -0,0 +1,11 @@
+import benchmark_startup
+
+
+def test_cold_start_within_budget(tmp_path, monkeypatch):
+    # The rendered app opens its audit log; keep it out of the working tree
+    monkeypatch.setenv("TITER_AUDIT_LOG", str(tmp_path / "audit.jsonl"))
+    result = benchmark_startup.measure(runs=1)
+    assert result['exceptions'] == []
+    assert result['loaded'] == []
+    assert result['import_s'] <= benchmark_startup.IMPORT_BUDGET_S
+    assert result['first_render_s'] <= benchmark_startup.FIRST_RENDER_BUDGET_S